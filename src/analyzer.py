@@ -0,0 +1,275 @@
+import json
+import os
+import re
+import uuid
+from collections.abc import Iterator, Mapping, Sequence
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+from docx import Document
+from docx.document import Document as DocumentObject
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+
+from logger import logger, _
+from config import Config
+from jobs import APP_VARIABLES, DocTemplate
+from native import HEADER_FOOTER_PARTS
+from utils import get_file_hash
+
+
+CACHE_FILE_NAME = ".placeholders_cache.json"
+# Catalogs cached with another version are analyzed again.
+CACHE_VERSION = 3
+# Column names may be in any language and contain spaces or hyphens.
+PLACEHOLDER_PATTERN = re.compile(r"\[([^\[\]]+)\]")
+
+
+# Elements process_document does not look into; their text is kept as is.
+CONTAINER_NAMES = {
+    qn("w:sdt"): "content control",
+    qn("w:hyperlink"): "hyperlink",
+    qn("w:txbxContent"): "text box",
+    qn("w:fldSimple"): "field",
+    qn("w:smartTag"): "smart tag",
+    qn("w:customXml"): "custom XML",
+    qn("w:ins"): "tracked change",
+}
+# Word stores text boxes twice, for new and for old readers.
+MC_FALLBACK = (
+    "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+)
+
+
+@dataclass
+class Placeholder:
+    name: str
+    part: str
+    split: bool
+
+
+@dataclass
+class TemplateCatalog:
+    template_hash: str
+    placeholders: list[Placeholder] = field(default_factory=list)
+
+    @property
+    def names(self) -> set[str]:
+        return {placeholder.name for placeholder in self.placeholders}
+
+
+def iter_table_paragraphs(table: Table) -> Iterator[Paragraph]:
+    for row in table.rows:
+        for cell in row.cells:
+            yield from cell.paragraphs
+            for nested_table in cell.tables:
+                yield from iter_table_paragraphs(nested_table)
+
+
+def iter_document_parts(doc: DocumentObject) -> Iterator[tuple[str, Any]]:
+    yield "body", doc._body
+    for number, section in enumerate(doc.sections, 1):
+        for part_name in HEADER_FOOTER_PARTS:
+            part = getattr(section, part_name)
+            if part.is_linked_to_previous:
+                continue
+            yield f"section {number} {part_name.replace('_', ' ')}", part
+
+
+def iter_document_paragraphs(
+    doc: DocumentObject,
+) -> Iterator[tuple[str, Paragraph]]:
+    for part_label, part in iter_document_parts(doc):
+        for paragraph in part.paragraphs:
+            yield part_label, paragraph
+        for table in part.tables:
+            for paragraph in iter_table_paragraphs(table):
+                yield part_label, paragraph
+
+
+def iter_placeholder_matches(text: str) -> Iterator[re.Match[str]]:
+    # replace_words_in_paragraph only looks for upper-cased keys, so bracketed
+    # text such as "[1]" or "[sic]" is not a placeholder.
+    for match in PLACEHOLDER_PATTERN.finditer(text):
+        if match.group(1).isupper():
+            yield match
+
+
+def get_container_name(run: Any) -> str:
+    for ancestor in run.iterancestors():
+        if ancestor.tag in CONTAINER_NAMES:
+            return CONTAINER_NAMES[ancestor.tag]
+    return run.getparent().tag.split("}")[-1]
+
+
+def find_placeholders(
+    paragraph: Any,
+    replaced: bool,
+) -> Iterator[tuple[str, bool, str | None]]:
+    # Word often splits text into several runs, e.g. after spell checking,
+    # so the placeholders are searched in the whole paragraph text and the
+    # run borders are used to tell which of them are split. Only the runs
+    # directly in a replaced paragraph are filled; placeholders in other
+    # runs are returned with the element they are in.
+    run_texts: dict[Any, str] = {}
+    for text_element in paragraph.iter(qn("w:t")):
+        if next(text_element.iterancestors(qn("w:p"))) is paragraph:
+            run = text_element.getparent()
+            run_texts[run] = run_texts.get(run, "") + (text_element.text or "")
+    run_ends = []
+    containers: list[str | None] = []
+    text = ""
+    for run, run_text in run_texts.items():
+        text += run_text
+        run_ends.append(len(text))
+        if replaced and run.getparent() is paragraph:
+            containers.append(None)
+        else:
+            containers.append(get_container_name(run))
+    for match in iter_placeholder_matches(text):
+        start, end = match.span()
+        split = any(start < run_end < end for run_end in run_ends)
+        run_start = 0
+        container = None
+        for run_end, run_container in zip(run_ends, containers):
+            if run_start < end and run_end > start and run_container:
+                container = run_container
+                break
+            run_start = run_end
+        yield match.group(1), split, container
+
+
+def analyze_template(path: Path, template_hash: str) -> TemplateCatalog:
+    catalog = TemplateCatalog(template_hash=template_hash)
+    doc = Document(str(path))
+    replaced_paragraphs = {
+        paragraph._p
+        for part, paragraph in iter_document_paragraphs(doc)
+        if part == "body"
+    }
+    for part_label, part in iter_document_parts(doc):
+        for paragraph in part._element.iter(qn("w:p")):
+            if any(
+                ancestor.tag == MC_FALLBACK
+                for ancestor in paragraph.iterancestors()
+            ):
+                continue
+            for name, split, container in find_placeholders(
+                paragraph, paragraph in replaced_paragraphs
+            ):
+                if part_label != "body" or container is None:
+                    container = part_label
+                catalog.placeholders.append(
+                    Placeholder(name=name, part=container, split=split)
+                )
+    return catalog
+
+
+def load_cache(cache_path: Path) -> dict[str, dict]:
+    if not cache_path.exists():
+        return {}
+    try:
+        return json.loads(cache_path.read_text(encoding="utf-8"))
+    except json.JSONDecodeError:
+        return {}
+
+
+def get_template_catalogs(
+    config: Config,
+    doc_templates: Mapping[str, DocTemplate],
+) -> dict[str, TemplateCatalog]:
+    cache_path = config["DOC_TEMPLATES_DIR"] / CACHE_FILE_NAME
+    cache = load_cache(cache_path)
+    catalogs = {}
+    updated = False
+    for label, doc_template in doc_templates.items():
+        template_hash = get_file_hash(doc_template.path)
+        cached = cache.get(doc_template.name)
+        if (
+            cached
+            and cached["template_hash"] == template_hash
+            and cached.get("version") == CACHE_VERSION
+        ):
+            catalogs[label] = TemplateCatalog(
+                template_hash=template_hash,
+                placeholders=[
+                    Placeholder(**placeholder)
+                    for placeholder in cached["placeholders"]
+                ],
+            )
+            continue
+        logger.debug(
+            _("Template {path} analyzed").format(path=doc_template.path)
+        )
+        catalogs[label] = analyze_template(doc_template.path, template_hash)
+        cache[doc_template.name] = {
+            **asdict(catalogs[label]),
+            "version": CACHE_VERSION,
+        }
+        updated = True
+    if updated:
+        # Batch nodes may analyze the templates at once, so the cache is
+        # moved into place only when complete.
+        tmp_cache_path = cache_path.with_suffix(f".{uuid.uuid4().hex}.json")
+        try:
+            tmp_cache_path.write_text(
+                json.dumps(cache, ensure_ascii=False, indent=2),
+                encoding="utf-8",
+            )
+            os.replace(tmp_cache_path, cache_path)
+        except OSError as e:
+            tmp_cache_path.unlink(missing_ok=True)
+            logger.debug(f"{e}")
+    return catalogs
+
+
+def check_templates(
+    config: Config,
+    doc_templates: Mapping[str, DocTemplate],
+    headers: Sequence[str],
+    report_unused: bool = True,
+) -> dict[str, TemplateCatalog]:
+    catalogs = get_template_catalogs(config, doc_templates)
+    known_names = {name.upper() for name in [*APP_VARIABLES, *headers]}
+    errors = []
+    for label, catalog in catalogs.items():
+        for placeholder in catalog.placeholders:
+            if placeholder.name not in known_names:
+                message = _(
+                    '{template}: unknown placeholder "{name}" ({part})'
+                )
+            elif placeholder.split:
+                message = _(
+                    '{template}: placeholder "{name}" is split by formatting '
+                    "({part})"
+                )
+            elif placeholder.part != "body":
+                message = _(
+                    '{template}: placeholder "{name}" is not replaced in '
+                    "{part}"
+                )
+            else:
+                continue
+            errors.append(
+                message.format(
+                    template=label,
+                    name=placeholder.name,
+                    part=placeholder.part,
+                )
+            )
+
+    used_names = set().union(*(catalog.names for catalog in catalogs.values()))
+    unused_headers = [
+        header for header in headers if header.upper() not in used_names
+    ]
+    if report_unused and unused_headers:
+        logger.warning(
+            _("Columns not used in templates: {headers}").format(
+                headers=", ".join(unused_headers)
+            )
+        )
+    if errors:
+        raise ValueError("\n".join(errors))
+    return catalogs
@@ -1,30 +1,28 @@
 import wx
-import calendar
 from pprint import pformat
-import re
-from dataclasses import dataclass
+from collections.abc import Mapping
 from pathlib import Path
 from typing import Literal, Any
 
 import wx._core
 
 from logger import logger, _
+from analyzer import check_templates, get_template_catalogs
 from config import load_config
+from jobs import (
+    APP_VARIABLES,
+    DocTemplate,
+    build_job,
+    get_month_labels,
+    load_doc_templates,
+    render_templates,
+)
 from utils import (
-    csv_to_dict,
-    convert_docx_template_to_pdf,
+    csv_to_table,
     number_to_words_currency,
 )
 
 
-@dataclass
-class DocTemplate:
-    label: str
-    name: str
-    path: Path
-    prefix: str
-
-
 class NumericTextCtrl(wx.TextCtrl):
     def __init__(
         self,
@@ -101,20 +99,7 @@ class AppFrame(wx.Frame):
             return
 
     def set_app_variables(self) -> None:
-        self.app_variables = {
-            "DOC_TEMPLATE_LABEL",
-            "DOC_TEMPLATE_NAME",
-            "DOC_TEMPLATE_PREFIX",
-            "DATE_DAY",
-            "DATE_MONTH_LABEL",
-            "DATE_MONTH",
-            "DATE_YEAR",
-            "EXECUTOR_LABEL",
-            "DOC_NUM",
-            "AMOUNT",
-            "AMOUNT_INT",
-            "AMOUNT_TEXT",
-        }
+        self.app_variables = set(APP_VARIABLES)
         self.log(_("App variables ready"))
         logger.debug(
             "App variables:\n{app_variables}".format(
@@ -124,24 +109,19 @@ class AppFrame(wx.Frame):
 
     def load_doc_templates(self) -> None:
         self.doc_templates: dict[str, DocTemplate] = {}
-        for label, name, prefix in self.config["DOC_TEMPLATES_FILES"]:
-            path = self.config["DOC_TEMPLATES_DIR"] / name
-            if not path.exists():
-                self.log(
-                    text=_('File "{path}" not found').format(path=path),
-                    level="error",
-                    show_msg=True,
-                    msg_caption=_("Error"),
-                    msg_style=wx.OK | wx.ICON_ERROR,
-                )
-                self.Close()
-                return
-            self.doc_templates[label] = DocTemplate(
-                label=label,
-                name=name,
-                path=path,
-                prefix=prefix,
+        self.selected_doc_templates: list[DocTemplate] = []
+        try:
+            self.doc_templates = load_doc_templates(self.config)
+        except (FileNotFoundError, ValueError) as e:
+            self.log(
+                text=f"{e}",
+                level="error",
+                show_msg=True,
+                msg_caption=_("Error"),
+                msg_style=wx.OK | wx.ICON_ERROR,
             )
+            self.Close()
+            return
         self.log(
             _("Templates loaded: {doc_templates}").format(
                 doc_templates=len(self.doc_templates)
@@ -149,8 +129,9 @@ class AppFrame(wx.Frame):
         )
 
     def load_executors(self) -> None:
+        self.executors: Mapping[str, Mapping[str, str]] = {}
         try:
-            self.executors = csv_to_dict(
+            self.executors = csv_to_table(
                 csv_path=self.config["DATA_PATH"],
                 wrong_headers=self.app_variables,
             )
@@ -162,7 +143,6 @@ class AppFrame(wx.Frame):
             )
             logger.error(_("Invalid headers: {e}").format(e=e))
             self.Close()
-            self.executors = {}
             return
         self.log(
             _("Executors is loaded: {count}").format(
@@ -187,6 +167,15 @@ class AppFrame(wx.Frame):
         content += "\nFROM HEADERS:\n\n"
         for header in list(self.executors.values())[0].keys():
             content += f"[{header}]\n"
+        try:
+            catalogs = get_template_catalogs(self.config, self.doc_templates)
+        except (OSError, ValueError) as e:
+            logger.error(f"{e}")
+            catalogs = {}
+        for label, catalog in catalogs.items():
+            content += f"\nFROM TEMPLATE {label.upper()}:\n\n"
+            for name in sorted(catalog.names):
+                content += f"[{name}]\n"
         wx.MessageBox(
             content,
             _("Replaceable fields"),
@@ -257,6 +246,13 @@ class AppFrame(wx.Frame):
             panel, choices=list(self.doc_templates.keys())
         )
         sizer.Add(self.doc_template_choice, 0, wx.ALL | wx.EXPAND, 5)
+        self.all_templates_checkbox = wx.CheckBox(
+            panel, label=_("All document types")
+        )
+        self.all_templates_checkbox.Bind(
+            wx.EVT_CHECKBOX, self.on_all_templates
+        )
+        sizer.Add(self.all_templates_checkbox, 0, wx.ALL, 5)
         doctype_help = wx.StaticText(panel, label=_("Document type help"))
         doctype_help.SetForegroundColour(wx.RED)
         sizer.Add(doctype_help, 0, wx.ALL, 5)
@@ -269,20 +265,7 @@ class AppFrame(wx.Frame):
             wx.ALL,
             5,
         )
-        self.month_choiceses = [
-            _("january"),
-            _("february"),
-            _("march"),
-            _("april"),
-            _("may"),
-            _("june"),
-            _("july"),
-            _("august"),
-            _("september"),
-            _("october"),
-            _("november"),
-            _("december"),
-        ]
+        self.month_choiceses = get_month_labels()
         # current_year = str(datetime.datetime.now().year)
         years = [
             str(i)
@@ -343,8 +326,11 @@ class AppFrame(wx.Frame):
         panel.SetSizer(sizer)
         self.log(_("UI created"))
 
+    def on_all_templates(self, event: wx.CommandEvent) -> None:
+        self.doc_template_choice.Enable(not event.IsChecked())
+
     def set_app_settings(self) -> None:
-        self.SetSize((300, 550))
+        self.SetSize((300, 580))
 
         title = f"{self.config['PROJECT_NAME']} | v.{self.config['PROJECT_VERSION']}"
         self.SetTitle(title)
@@ -393,27 +379,60 @@ class AppFrame(wx.Frame):
 
     def convert_document(self) -> None:
         self.log(_("Converting document"))
+        try:
+            check_templates(
+                self.config,
+                {
+                    doc_template.label: doc_template
+                    for doc_template in self.selected_doc_templates
+                },
+                list(self.config["EXECUTOR_DATA"].keys()),
+                report_unused=False,
+            )
+        except ValueError as e:
+            self.log(
+                _("Templates check failed:\n{errors}").format(errors=e),
+                "error",
+                show_msg=True,
+                msg_caption=_("Error"),
+                msg_style=wx.OK | wx.ICON_ERROR,
+            )
+            return
         replacement_words = self.get_replacement_words()
-        pdf_file_name = self.config["PDF_NAME_MASK"].format(**self.config)
-        pdf_file_path = self.config["PDF_DIR"] / pdf_file_name
-        convert_docx_template_to_pdf(
-            docx_template_path=self.config["DOC_TEMPLATE_PATH"],
-            pdf_file_path=pdf_file_path,
-            replacement_words=replacement_words,
-        )
-        if pdf_file_path.exists():
+        try:
+            pdf_file_paths = render_templates(
+                config=self.config,
+                doc_templates=self.selected_doc_templates,
+                replacement_words=replacement_words,
+                pdf_name_mask=self.config["PDF_NAME_MASK"],
+            )
+        except Exception as e:
+            # Besides duplicate file names, conversion errors (e.g. docx2pdf
+            # failing to start Word) are shown to the user.
+            self.log(
+                f"{e}",
+                "error",
+                show_msg=True,
+                msg_caption=_("Error"),
+                msg_style=wx.OK | wx.ICON_ERROR,
+            )
+            return
+        if all(pdf_file_path.exists() for pdf_file_path in pdf_file_paths):
             self.log(
                 _("Conversion successful"),
                 msg_message=_("File created: {file_name}").format(
-                    file_name=pdf_file_name
+                    file_name=", ".join(
+                        pdf_file_path.name for pdf_file_path in pdf_file_paths
+                    )
                 ),
                 msg_caption=_("Success"),
             )
-            self.log(
-                _("Document created: {path}").format(path=pdf_file_path),
-                "debug",
-                set_status=False,
-            )
+            for pdf_file_path in pdf_file_paths:
+                self.log(
+                    _("Document created: {path}").format(path=pdf_file_path),
+                    "debug",
+                    set_status=False,
+                )
             if self.config["FINISH_AFTER_SUCCESS"]:
                 self.log(_("Application will be closed"))
                 self.Close()
@@ -428,72 +447,28 @@ class AppFrame(wx.Frame):
     def is_fields_valid(self) -> bool:
         self.log(_("Validating fields"))
         doc_template = self.doc_template_choice.GetStringSelection()
-        if doc_template:
-            self.config["DOC_TEMPLATE_LABEL"] = doc_template
-            self.config["DOC_TEMPLATE_NAME"] = self.doc_templates[
-                doc_template
-            ].name
-            self.config["DOC_TEMPLATE_PATH"] = self.doc_templates[
-                doc_template
-            ].path
-            self.config["DOC_TEMPLATE_PREFIX"] = self.doc_templates[
-                doc_template
-            ].prefix
-        else:
-            self.log(
-                _("Document template not selected"),
-                "error",
-                show_msg=True,
-                msg_caption=_("Error"),
-                msg_style=wx.OK | wx.ICON_ERROR,
-            )
-            return False
-
-        date_day = self.day_choice.GetStringSelection()
+        if self.all_templates_checkbox.IsChecked():
+            doc_template = next(iter(self.doc_templates), "")
         date_month = self.month_choice.GetStringSelection()
-        if date_month:
-            date_month_num = self.month_choiceses.index(date_month) + 1
-        date_year = self.year_choice.GetStringSelection()
-        if date_day and date_month and date_year:
-            self.config["DATE_DAY"] = date_day
-            self.config["DATE_MONTH_LABEL"] = date_month
-            self.config["DATE_MONTH"] = f"{date_month_num:02d}"
-            self.config["DATE_YEAR"] = date_year
-        else:
-            self.log(
-                _("Date not selected"),
-                "error",
-                show_msg=True,
-                msg_caption=_("Error"),
-                msg_style=wx.OK | wx.ICON_ERROR,
-            )
-            return False
-
-        first_day, days_in_month = calendar.monthrange(
-            int(date_year), date_month_num
-        )
-        good_days = [str(i).zfill(2) for i in range(1, days_in_month + 1)]
-        current_day = date_day
-
-        if current_day not in good_days:
-            self.log(
-                _("There are only {count} days in this month.").format(
-                    count=len(good_days)
-                ),
-                "error",
-                show_msg=True,
-                msg_caption=_("Error"),
-                msg_style=wx.OK | wx.ICON_ERROR,
+        record = {
+            "DOC_TEMPLATE_LABEL": doc_template,
+            "DATE_DAY": self.day_choice.GetStringSelection(),
+            "DATE_MONTH": str(self.month_choiceses.index(date_month) + 1)
+            if date_month
+            else "",
+            "DATE_YEAR": self.year_choice.GetStringSelection(),
+            "EXECUTOR_LABEL": self.executor_choice.GetStringSelection(),
+            "DOC_NUM": self.billnum_input.GetValue(),
+            "AMOUNT": self.price_input.GetValue(),
+        }
+        # The same checks as for batch rows and job files.
+        try:
+            job = build_job(
+                self.config, record, self.doc_templates, self.executors
             )
-            return False
-
-        executor_label = self.executor_choice.GetStringSelection()
-        if executor_label:
-            self.config["EXECUTOR_LABEL"] = executor_label
-            self.config["EXECUTOR_DATA"] = self.executors[executor_label]
-        else:
+        except ValueError as e:
             self.log(
-                _("Executor not selected"),
+                f"{e}",
                 "error",
                 show_msg=True,
                 msg_caption=_("Error"),
@@ -501,44 +476,30 @@ class AppFrame(wx.Frame):
             )
             return False
 
-        if all(
-            [
-                self.billnum_input.GetValue(),
-                re.match(r"^\d+$", self.billnum_input.GetValue()),
-            ]
-        ):
-            self.config["DOC_NUM"] = self.billnum_input.GetValue()
+        if self.all_templates_checkbox.IsChecked():
+            self.selected_doc_templates = list(self.doc_templates.values())
         else:
-            self.log(
-                _("Document number not entered or entered incorrectly"),
-                "error",
-                show_msg=True,
-                msg_caption=_("Error"),
-                msg_style=wx.OK | wx.ICON_ERROR,
-            )
-            return False
-
-        if all(
-            [
-                self.price_input.GetValue(),
-                re.match(r"^\d+$", self.price_input.GetValue()),
+            self.selected_doc_templates = [
+                self.doc_templates[job.template_label]
             ]
-        ):
-            self.config["AMOUNT"] = self.price_input.GetValue()
-            self.config["AMOUNT_INT"] = int(self.price_input.GetValue())
-            self.config["AMOUNT_TEXT"] = number_to_words_currency(
-                self.config["AMOUNT_INT"],
-                self.config["CURRENCY_PLURALIZE"],
-            ).capitalize()
-        else:
-            self.log(
-                _("Amount not entered or entered incorrectly"),
-                "error",
-                show_msg=True,
-                msg_caption=_("Error"),
-                msg_style=wx.OK | wx.ICON_ERROR,
-            )
-            return False
+        selected_doc_template = self.doc_templates[job.template_label]
+        self.config["DOC_TEMPLATE_LABEL"] = selected_doc_template.label
+        self.config["DOC_TEMPLATE_NAME"] = selected_doc_template.name
+        self.config["DOC_TEMPLATE_PATH"] = selected_doc_template.path
+        self.config["DOC_TEMPLATE_PREFIX"] = selected_doc_template.prefix
+        self.config["DATE_DAY"] = job.date_day
+        self.config["DATE_MONTH_LABEL"] = date_month
+        self.config["DATE_MONTH"] = job.date_month
+        self.config["DATE_YEAR"] = job.date_year
+        self.config["EXECUTOR_LABEL"] = job.executor_label
+        self.config["EXECUTOR_DATA"] = self.executors[job.executor_label]
+        self.config["DOC_NUM"] = job.doc_num
+        self.config["AMOUNT"] = job.amount
+        self.config["AMOUNT_INT"] = int(job.amount)
+        self.config["AMOUNT_TEXT"] = number_to_words_currency(
+            self.config["AMOUNT_INT"],
+            self.config["CURRENCY_PLURALIZE"],
+        ).capitalize()
 
         logger.debug("Config:\n{config}".format(config=pformat(self.config)))
         self.log(_("Validation passed"))
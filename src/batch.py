@@ -0,0 +1,292 @@
+import argparse
+import hashlib
+import multiprocessing
+import os
+import re
+import socket
+import time
+import zlib
+from collections.abc import Mapping
+from datetime import date
+from pathlib import Path
+
+from logger import logger, _
+from analyzer import check_templates
+from config import Config, load_config
+from jobs import (
+    APP_VARIABLES,
+    DocTemplate,
+    Job,
+    load_doc_templates,
+)
+from manifest import Manifest, open_manifest
+from planner import RenderGroup, log_plan_summary, plan_renders, render_group
+from utils import csv_to_table
+
+
+POLL_INTERVAL = 5.0
+
+
+def get_batch_jobs(
+    doc_templates: dict[str, DocTemplate],
+    executors: Mapping[str, Mapping[str, str]],
+    doc_date: date,
+    doc_num: str,
+    amount: str,
+) -> list[Job]:
+    jobs = [
+        Job(
+            template_label=template_label,
+            executor_label=executor_label,
+            date_day=f"{doc_date.day:02d}",
+            date_month=f"{doc_date.month:02d}",
+            date_year=str(doc_date.year),
+            doc_num=doc_num,
+            amount=amount,
+        )
+        for executor_label in executors
+        for template_label in doc_templates
+    ]
+    return sorted(jobs, key=lambda job: job.key)
+
+
+def plan_shards(
+    groups: list[RenderGroup],
+    shard_count: int,
+) -> list[list[RenderGroup]]:
+    # Jobs with the same content are kept in one shard, so the document is
+    # rendered once and linked to the other outputs.
+    shards: list[list[RenderGroup]] = [[] for shard_id in range(shard_count)]
+    for group in groups:
+        shard_id = zlib.crc32(group.content_key.encode("utf-8")) % shard_count
+        shards[shard_id].append(group)
+    return shards
+
+
+def get_jobs_fingerprint(groups: list[RenderGroup]) -> str:
+    # The shards depend on the content of the documents, so nodes must agree
+    # on it as well as on the jobs.
+    digest = hashlib.sha256()
+    for group in groups:
+        digest.update(group.content_key.encode("utf-8"))
+        digest.update(b"\n")
+        for job in group.outputs:
+            digest.update(job.key.encode("utf-8"))
+            digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def process_shard(
+    config: Config,
+    manifest: Manifest,
+    node: str,
+    shard_id: int,
+    groups: list[RenderGroup],
+    doc_templates: dict[str, DocTemplate],
+    executors: Mapping[str, Mapping[str, str]],
+) -> int:
+    rendered = 0
+    failed = False
+    done_jobs = manifest.get_done_jobs(
+        [job.key for group in groups for job in group.outputs]
+    )
+    for group in groups:
+        jobs = [job for job in group.outputs if job.key not in done_jobs]
+        if not jobs:
+            continue
+        try:
+            render_group(config, group, jobs, doc_templates, executors)
+        except Exception as e:
+            logger.error(
+                _("Job {job} failed: {e}").format(job=jobs[0].key, e=e),
+            )
+            manifest.mark_done(
+                [job.key for job in jobs], shard_id, node, error=f"{e}"
+            )
+            failed = True
+        else:
+            manifest.mark_done([job.key for job in jobs], shard_id, node)
+            rendered += len(jobs)
+        if not manifest.renew(shard_id, node, config["BATCH_LEASE_SECONDS"]):
+            logger.warning(
+                _("Node {node} lost shard {shard_id}").format(
+                    node=node, shard_id=shard_id
+                )
+            )
+            return rendered
+    if not manifest.finish(shard_id, node, failed=failed):
+        logger.warning(
+            _("Node {node} released shard {shard_id} for a retry").format(
+                node=node, shard_id=shard_id
+            )
+        )
+        return rendered
+    logger.info(
+        _("Node {node} finished shard {shard_id}").format(
+            node=node, shard_id=shard_id
+        )
+    )
+    return rendered
+
+
+def run_node(
+    node: str,
+    manifest_path: Path,
+    doc_date: date,
+    doc_num: str,
+    amount: str,
+) -> int:
+    config = load_config()
+    doc_templates = load_doc_templates(config)
+    executors = csv_to_table(
+        csv_path=config["DATA_PATH"],
+        wrong_headers=set(APP_VARIABLES),
+    )
+    try:
+        catalogs = check_templates(config, doc_templates, executors.headers)
+    except ValueError as e:
+        logger.error(_("Templates check failed:\n{errors}").format(errors=e))
+        raise SystemExit(1)
+    jobs = get_batch_jobs(doc_templates, executors, doc_date, doc_num, amount)
+    groups = plan_renders(config, jobs, doc_templates, executors, catalogs)
+    log_plan_summary(len(jobs), len(groups))
+    shard_count = config["BATCH_SHARD_COUNT"]
+    shards = plan_shards(groups, shard_count)
+
+    manifest = open_manifest(manifest_path)
+    manifest.prepare(get_jobs_fingerprint(groups), shard_count)
+    logger.info(
+        _("Node {node} started: {count} jobs in {shards} shards").format(
+            node=node, count=len(jobs), shards=shard_count
+        )
+    )
+
+    rendered = 0
+    while not manifest.is_finished():
+        shard_id = manifest.claim(node, config["BATCH_LEASE_SECONDS"])
+        if shard_id is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+        rendered += process_shard(
+            config=config,
+            manifest=manifest,
+            node=node,
+            shard_id=shard_id,
+            groups=shards[shard_id],
+            doc_templates=doc_templates,
+            executors=executors,
+        )
+
+    logger.info(
+        _("Node {node} finished: {count} documents rendered").format(
+            node=node, count=rendered
+        )
+    )
+    logger.info(
+        _("Batch summary: {summary}").format(summary=manifest.get_summary())
+    )
+    return rendered
+
+
+def run_local_nodes(
+    count: int,
+    node: str,
+    manifest_path: Path,
+    doc_date: date,
+    doc_num: str,
+    amount: str,
+) -> None:
+    processes = [
+        multiprocessing.Process(
+            name=f"{node}-{number}",
+            target=run_node,
+            kwargs={
+                "node": f"{node}-{number}",
+                "manifest_path": manifest_path,
+                "doc_date": doc_date,
+                "doc_num": doc_num,
+                "amount": amount,
+            },
+        )
+        for number in range(1, count + 1)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        if process.exitcode:
+            logger.error(
+                _("Node {node} exited with code {code}").format(
+                    node=process.name, code=process.exitcode
+                )
+            )
+
+
+def numeric(value: str) -> str:
+    if not re.match(r"^[0-9]+$", value):
+        raise argparse.ArgumentTypeError(
+            _("only numbers allowed"),
+        )
+    return value
+
+
+def check_date_year(config: Config, doc_date: date) -> None:
+    if not (
+        config["DATE_YEAR_MIN"] <= doc_date.year <= config["DATE_YEAR_MAX"]
+    ):
+        raise SystemExit(
+            _("Year must be between {min} and {max}").format(
+                min=config["DATE_YEAR_MIN"], max=config["DATE_YEAR_MAX"]
+            )
+        )
+
+
+def run_batch(args: argparse.Namespace) -> None:
+    check_date_year(load_config(), args.date)
+    if args.processes > 1:
+        run_local_nodes(
+            count=args.processes,
+            node=args.node,
+            manifest_path=args.manifest,
+            doc_date=args.date,
+            doc_num=args.doc_num,
+            amount=args.amount,
+        )
+        return
+    run_node(
+        node=args.node,
+        manifest_path=args.manifest,
+        doc_date=args.date,
+        doc_num=args.doc_num,
+        amount=args.amount,
+    )
+
+
+def add_batch_parser(subparsers: argparse._SubParsersAction) -> None:
+    parser = subparsers.add_parser(
+        "batch",
+        help=_("Render all templates for all executors"),
+    )
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        required=True,
+        help=_(
+            "Shared manifest: a directory for lock files or a .sqlite file"
+        ),
+    )
+    parser.add_argument("--date", type=date.fromisoformat, required=True)
+    parser.add_argument("--doc-num", type=numeric, required=True)
+    parser.add_argument("--amount", type=numeric, required=True)
+    parser.add_argument(
+        "--node",
+        default=f"{socket.gethostname()}-{os.getpid()}",
+        help=_("Unique node name"),
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help=_("Run several local nodes"),
+    )
+    parser.set_defaults(handler=run_batch)
@@ -0,0 +1,111 @@
+import argparse
+import tempfile
+import time
+from datetime import date
+from itertools import cycle, islice
+from pathlib import Path
+
+from logger import logger, _
+from batch import get_batch_jobs, numeric
+from config import load_config
+from jobs import (
+    APP_VARIABLES,
+    RENDERERS,
+    get_replacement_words,
+    load_doc_templates,
+)
+from utils import (
+    convert_docx_template_to_pdf,
+    convert_docx_template_to_pdf_quickly,
+    csv_to_table,
+)
+
+
+def run_benchmark(args: argparse.Namespace) -> None:
+    config = load_config()
+    doc_templates = load_doc_templates(config)
+    executors = csv_to_table(
+        csv_path=config["DATA_PATH"],
+        wrong_headers=set(APP_VARIABLES),
+    )
+    # The data file is usually short, so its jobs are repeated up to count.
+    jobs = list(
+        islice(
+            cycle(
+                get_batch_jobs(
+                    doc_templates, executors, date.today(), "1", args.amount
+                )
+            ),
+            args.count,
+        )
+    )
+    # docx2pdf is the baseline the other renderers are compared with.
+    renderers = dict.fromkeys(["docx2pdf", *(args.renderer or RENDERERS)])
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for renderer in renderers:
+            started_at = time.perf_counter()
+            fallbacks = 0
+            try:
+                for number, job in enumerate(jobs):
+                    doc_template = doc_templates[job.template_label]
+                    pdf_file_path = Path(tmp_dir) / f"{renderer}.{number}.pdf"
+                    replacement_words = get_replacement_words(
+                        config=config,
+                        job=job,
+                        doc_template=doc_template,
+                        executor_data=executors[job.executor_label],
+                    )
+                    if convert_docx_template_to_pdf_quickly(
+                        docx_template_path=doc_template.path,
+                        pdf_file_path=pdf_file_path,
+                        replacement_words=replacement_words,
+                        renderer=renderer,
+                        fonts=config["NATIVE_FONTS"],
+                    ):
+                        continue
+                    if renderer != "docx2pdf":
+                        fallbacks += 1
+                    convert_docx_template_to_pdf(
+                        docx_template_path=doc_template.path,
+                        pdf_file_path=pdf_file_path,
+                        replacement_words=replacement_words,
+                    )
+            except Exception as e:
+                # docx2pdf raises NotImplementedError where Microsoft Word
+                # is not installed.
+                logger.warning(
+                    _("{renderer} skipped: {error}").format(
+                        renderer=renderer, error=f"{type(e).__name__}: {e}"
+                    )
+                )
+                continue
+            elapsed = time.perf_counter() - started_at
+            logger.info(
+                _(
+                    "{renderer}: {count} documents in {elapsed:.2f} s, "
+                    "{rate:.1f} documents/s, {fallbacks} fallbacks to "
+                    "docx2pdf"
+                ).format(
+                    renderer=renderer,
+                    count=len(jobs),
+                    elapsed=elapsed,
+                    rate=len(jobs) / elapsed,
+                    fallbacks=fallbacks,
+                )
+            )
+
+
+def add_benchmark_parser(subparsers: argparse._SubParsersAction) -> None:
+    parser = subparsers.add_parser(
+        "benchmark",
+        help=_("Compare the throughput of the PDF renderers"),
+    )
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--amount", type=numeric, default="1000")
+    parser.add_argument(
+        "--renderer",
+        choices=RENDERERS,
+        action="append",
+        help=_("Renderer to compare with docx2pdf, all by default"),
+    )
+    parser.set_defaults(handler=run_benchmark)
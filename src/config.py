@@ -1,3 +1,4 @@
+from collections.abc import Mapping
 from pathlib import Path
 from typing import TypedDict, Any
 from pprint import pformat
@@ -19,7 +20,7 @@ class Config(TypedDict):
     DATA_DIR: Path
     DATA_NAME: str
     DATA_PATH: Path
-    DOC_TEMPLATES_FILES: list[tuple[str, str, str]]
+    DOC_TEMPLATES_FILES: list[tuple[str, ...]]
     DOC_TEMPLATES_DIR: Path
     DOC_TEMPLATE_LABEL: str
     DOC_TEMPLATE_NAME: str
@@ -30,10 +31,20 @@ class Config(TypedDict):
     # EXPORT FILES
     PDF_DIR: Path
     PDF_NAME_MASK: str
+    NATIVE_FONTS: dict[str, str]
+
+    # BATCH
+    BATCH_PDF_NAME_MASK: str
+    BATCH_SHARD_COUNT: int
+    BATCH_LEASE_SECONDS: int
+
+    # WATCH
+    WATCH_POLL_SECONDS: float
+    WATCH_DEBOUNCE_SECONDS: float
 
     # GUI ADDITIONAL VARIABLES
     EXECUTOR_LABEL: str
-    EXECUTOR_DATA: dict[str, str]
+    EXECUTOR_DATA: Mapping[str, str]
 
     DATE_DAY: str
     DATE_MONTH_LABEL: str
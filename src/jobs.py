@@ -0,0 +1,303 @@
+import calendar
+import os
+import re
+import uuid
+from collections.abc import Mapping, Sequence
+from typing import Any
+from dataclasses import dataclass
+from pathlib import Path
+
+from logger import logger, _
+from config import Config
+from utils import (
+    convert_docx_template_to_pdf,
+    convert_docx_templates_to_pdf,
+    number_to_words_currency,
+)
+
+
+APP_VARIABLES = frozenset(
+    {
+        "DOC_TEMPLATE_LABEL",
+        "DOC_TEMPLATE_NAME",
+        "DOC_TEMPLATE_PREFIX",
+        "DATE_DAY",
+        "DATE_MONTH_LABEL",
+        "DATE_MONTH",
+        "DATE_YEAR",
+        "EXECUTOR_LABEL",
+        "DOC_NUM",
+        "AMOUNT",
+        "AMOUNT_INT",
+        "AMOUNT_TEXT",
+    }
+)
+
+
+RENDERERS = ("docx2pdf", "native", "overlay")
+
+
+@dataclass
+class DocTemplate:
+    label: str
+    name: str
+    path: Path
+    prefix: str
+    renderer: str = "docx2pdf"
+
+
+@dataclass(frozen=True)
+class Job:
+    template_label: str
+    executor_label: str
+    date_day: str
+    date_month: str
+    date_year: str
+    doc_num: str
+    amount: str
+
+    @property
+    def key(self) -> str:
+        return "|".join(
+            [
+                self.template_label,
+                self.executor_label,
+                f"{self.date_year}-{self.date_month}-{self.date_day}",
+                self.doc_num,
+                self.amount,
+            ]
+        )
+
+
+def get_month_labels() -> list[str]:
+    return [
+        _("january"),
+        _("february"),
+        _("march"),
+        _("april"),
+        _("may"),
+        _("june"),
+        _("july"),
+        _("august"),
+        _("september"),
+        _("october"),
+        _("november"),
+        _("december"),
+    ]
+
+
+def load_doc_templates(config: Config) -> dict[str, DocTemplate]:
+    doc_templates: dict[str, DocTemplate] = {}
+    for label, name, prefix, *options in config["DOC_TEMPLATES_FILES"]:
+        path = config["DOC_TEMPLATES_DIR"] / name
+        if not path.exists():
+            raise FileNotFoundError(
+                _('File "{path}" not found').format(path=path)
+            )
+        renderer = options[0] if options else RENDERERS[0]
+        if renderer not in RENDERERS:
+            raise ValueError(
+                _('Unknown renderer "{renderer}" for {label}').format(
+                    renderer=renderer, label=label
+                )
+            )
+        doc_templates[label] = DocTemplate(
+            label=label,
+            name=name,
+            path=path,
+            prefix=prefix,
+            renderer=renderer,
+        )
+    return doc_templates
+
+
+def get_numeric_field(record: Mapping[str, Any], field: str) -> str | None:
+    value = str(record.get(field) or "").strip()
+    if not re.match(r"^[0-9]+$", value):
+        return None
+    return value
+
+
+def build_job(
+    config: Config,
+    record: Mapping[str, Any],
+    doc_templates: Mapping[str, DocTemplate],
+    executors: Mapping[str, Mapping[str, str]],
+) -> Job:
+    template_label = str(record.get("DOC_TEMPLATE_LABEL") or "")
+    if not template_label:
+        raise ValueError(_("Document template not selected"))
+    if template_label not in doc_templates:
+        raise ValueError(
+            _('Unknown value "{value}" in {field}').format(
+                value=template_label, field="DOC_TEMPLATE_LABEL"
+            )
+        )
+
+    date_day = get_numeric_field(record, "DATE_DAY")
+    date_month = get_numeric_field(record, "DATE_MONTH")
+    date_year = get_numeric_field(record, "DATE_YEAR")
+    if not (date_day and date_month and date_year):
+        raise ValueError(_("Date not selected"))
+    if not 1 <= int(date_month) <= 12:
+        raise ValueError(_("Date not selected"))
+    if not (
+        config["DATE_YEAR_MIN"] <= int(date_year) <= config["DATE_YEAR_MAX"]
+    ):
+        raise ValueError(
+            _("Year must be between {min} and {max}").format(
+                min=config["DATE_YEAR_MIN"], max=config["DATE_YEAR_MAX"]
+            )
+        )
+    first_day, days_in_month = calendar.monthrange(
+        int(date_year), int(date_month)
+    )
+    if not 1 <= int(date_day) <= days_in_month:
+        raise ValueError(
+            _("There are only {count} days in this month.").format(
+                count=days_in_month
+            )
+        )
+
+    executor_label = str(record.get("EXECUTOR_LABEL") or "")
+    if not executor_label:
+        raise ValueError(_("Executor not selected"))
+    if executor_label not in executors:
+        raise ValueError(
+            _('Unknown value "{value}" in {field}').format(
+                value=executor_label, field="EXECUTOR_LABEL"
+            )
+        )
+
+    doc_num = get_numeric_field(record, "DOC_NUM")
+    if not doc_num:
+        raise ValueError(
+            _("Document number not entered or entered incorrectly")
+        )
+
+    amount = get_numeric_field(record, "AMOUNT")
+    if not amount:
+        raise ValueError(_("Amount not entered or entered incorrectly"))
+
+    return Job(
+        template_label=template_label,
+        executor_label=executor_label,
+        date_day=f"{int(date_day):02d}",
+        date_month=f"{int(date_month):02d}",
+        date_year=date_year,
+        doc_num=doc_num,
+        amount=amount,
+    )
+
+
+def get_template_words(doc_template: DocTemplate) -> dict[str, str]:
+    return {
+        "DOC_TEMPLATE_LABEL": doc_template.label,
+        "DOC_TEMPLATE_NAME": doc_template.name,
+        "DOC_TEMPLATE_PREFIX": doc_template.prefix,
+    }
+
+
+def get_shared_replacement_words(
+    config: Config,
+    job: Job,
+    executor_data: Mapping[str, str],
+) -> dict[str, str]:
+    amount_int = int(job.amount)
+    pairs = {
+        "DATE_DAY": job.date_day,
+        "DATE_MONTH_LABEL": get_month_labels()[int(job.date_month) - 1],
+        "DATE_MONTH": job.date_month,
+        "DATE_YEAR": job.date_year,
+        "EXECUTOR_LABEL": job.executor_label,
+        "DOC_NUM": job.doc_num,
+        "AMOUNT": job.amount,
+        "AMOUNT_INT": str(amount_int),
+        "AMOUNT_TEXT": number_to_words_currency(
+            amount_int,
+            config["CURRENCY_PLURALIZE"],
+        ).capitalize(),
+    }
+    pairs |= executor_data
+    return pairs
+
+
+def get_replacement_words(
+    config: Config,
+    job: Job,
+    doc_template: DocTemplate,
+    executor_data: Mapping[str, str],
+) -> dict[str, str]:
+    return get_template_words(doc_template) | get_shared_replacement_words(
+        config, job, executor_data
+    )
+
+
+def get_pdf_file_path(
+    config: Config,
+    replacement_words: dict[str, str],
+) -> Path:
+    pdf_file_name = config["BATCH_PDF_NAME_MASK"].format(**replacement_words)
+    return config["PDF_DIR"] / pdf_file_name
+
+
+def render_templates(
+    config: Config,
+    doc_templates: Sequence[DocTemplate],
+    replacement_words: Mapping[str, Any],
+    pdf_name_mask: str,
+) -> list[Path]:
+    # The replacement words are shared by all templates, only the template
+    # fields differ between the documents.
+    documents = []
+    for doc_template in doc_templates:
+        words = {**replacement_words, **get_template_words(doc_template)}
+        pdf_file_path = config["PDF_DIR"] / pdf_name_mask.format(**words)
+        documents.append(
+            (doc_template.path, pdf_file_path, words, doc_template.renderer)
+        )
+    pdf_file_paths = [document[1] for document in documents]
+    if len(set(pdf_file_paths)) < len(pdf_file_paths):
+        raise ValueError(
+            _(
+                "File name mask {mask} gives the same name to several files"
+            ).format(mask=pdf_name_mask)
+        )
+    convert_docx_templates_to_pdf(documents, fonts=config["NATIVE_FONTS"])
+    return pdf_file_paths
+
+
+def render_job(
+    config: Config,
+    job: Job,
+    doc_templates: dict[str, DocTemplate],
+    executors: Mapping[str, Mapping[str, str]],
+) -> Path:
+    doc_template = doc_templates[job.template_label]
+    replacement_words = get_replacement_words(
+        config=config,
+        job=job,
+        doc_template=doc_template,
+        executor_data=executors[job.executor_label],
+    )
+    pdf_file_path = get_pdf_file_path(config, replacement_words)
+    # Render next to the target and move it into place atomically, so a
+    # node that dies mid-conversion never leaves a truncated document.
+    tmp_pdf_file_path = pdf_file_path.with_name(
+        f".{pdf_file_path.stem}.{uuid.uuid4().hex}.pdf"
+    )
+    try:
+        convert_docx_template_to_pdf(
+            docx_template_path=doc_template.path,
+            pdf_file_path=tmp_pdf_file_path,
+            replacement_words=replacement_words,
+            renderer=doc_template.renderer,
+            fonts=config["NATIVE_FONTS"],
+        )
+        os.replace(tmp_pdf_file_path, pdf_file_path)
+    finally:
+        tmp_pdf_file_path.unlink(missing_ok=True)
+    logger.debug(
+        _("Document created: {path}").format(path=pdf_file_path),
+    )
+    return pdf_file_path
@@ -0,0 +1,154 @@
+import argparse
+import csv
+import json
+from collections.abc import Iterator, Mapping
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, TextIO
+
+from logger import logger, _
+from analyzer import check_templates
+from config import Config, load_config
+from jobs import (
+    APP_VARIABLES,
+    DocTemplate,
+    Job,
+    build_job,
+    load_doc_templates,
+    render_job,
+)
+from utils import csv_to_table
+
+
+def read_jsonl_records(
+    file: TextIO,
+) -> Iterator[tuple[int, dict[str, Any] | str]]:
+    for line_number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            yield line_number, line.rstrip("\n")
+            continue
+        if not isinstance(record, dict):
+            yield line_number, line.rstrip("\n")
+            continue
+        yield line_number, record
+
+
+def read_csv_records(
+    file: TextIO,
+) -> Iterator[tuple[int, dict[str, Any] | str]]:
+    reader = csv.DictReader(file, delimiter=";")
+    for record in reader:
+        yield reader.line_num, record
+
+
+def read_job_records(
+    path: Path,
+) -> Iterator[tuple[int, dict[str, Any] | str]]:
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        if path.suffix == ".csv":
+            yield from read_csv_records(file)
+        else:
+            yield from read_jsonl_records(file)
+
+
+def write_reject(
+    rejects: TextIO,
+    line_number: int,
+    record: Mapping[str, Any] | str,
+    error: str,
+) -> None:
+    rejects.write(
+        json.dumps(
+            {"line": line_number, "record": record, "error": error},
+            ensure_ascii=False,
+        )
+        + "\n"
+    )
+    rejects.flush()
+
+
+def read_jobs(
+    path: Path,
+    config: Config,
+    doc_templates: Mapping[str, DocTemplate],
+    executors: Mapping[str, Mapping[str, str]],
+    rejects: TextIO,
+) -> Iterator[tuple[int, Job]]:
+    for line_number, record in read_job_records(path):
+        if isinstance(record, str):
+            write_reject(rejects, line_number, record, _("Invalid record"))
+            continue
+        try:
+            job = build_job(config, record, doc_templates, executors)
+        except ValueError as e:
+            write_reject(rejects, line_number, record, f"{e}")
+            continue
+        yield line_number, job
+
+
+def run_jobs(args: argparse.Namespace) -> None:
+    config = load_config()
+    doc_templates = load_doc_templates(config)
+    executors = csv_to_table(
+        csv_path=config["DATA_PATH"],
+        wrong_headers=set(APP_VARIABLES),
+    )
+    try:
+        check_templates(config, doc_templates, executors.headers)
+    except ValueError as e:
+        logger.error(_("Templates check failed:\n{errors}").format(errors=e))
+        raise SystemExit(1)
+    rejects_path = args.rejects or args.input.with_name(
+        f"{args.input.stem}.rejects.jsonl"
+    )
+    rendered = 0
+    failed = 0
+    with open(rejects_path, "w", encoding="utf-8") as rejects:
+        for line_number, job in read_jobs(
+            path=args.input,
+            config=config,
+            doc_templates=doc_templates,
+            executors=executors,
+            rejects=rejects,
+        ):
+            try:
+                render_job(config, job, doc_templates, executors)
+            except Exception as e:
+                logger.error(
+                    _("Job {job} failed: {e}").format(job=job.key, e=e),
+                )
+                write_reject(rejects, line_number, asdict(job), f"{e}")
+                failed += 1
+                continue
+            rendered += 1
+    logger.info(
+        _("Jobs finished: {rendered} rendered, {failed} failed").format(
+            rendered=rendered, failed=failed
+        )
+    )
+    logger.info(
+        _("Rejected records are written to {path}").format(path=rejects_path)
+    )
+
+
+def add_jobs_parser(subparsers: argparse._SubParsersAction) -> None:
+    parser = subparsers.add_parser(
+        "jobs",
+        help=_("Render documents from a JSONL or CSV job file"),
+    )
+    parser.add_argument(
+        "--input",
+        type=Path,
+        required=True,
+        help=_("Job file, one job per line: .jsonl or .csv"),
+    )
+    parser.add_argument(
+        "--rejects",
+        type=Path,
+        help=_("File for rejected records"),
+    )
+    parser.set_defaults(handler=run_jobs)
@@ -1,5 +1,26 @@
-from app import run_app
+import argparse
+
+from batch import add_batch_parser
+from benchmark import add_benchmark_parser
+from jobspec import add_jobs_parser
+from watch import add_watch_parser
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="doc-fill-master")
+    subparsers = parser.add_subparsers(dest="command")
+    add_batch_parser(subparsers)
+    add_watch_parser(subparsers)
+    add_jobs_parser(subparsers)
+    add_benchmark_parser(subparsers)
+    args = parser.parse_args()
+    if args.command is None:
+        from app import run_app
+
+        run_app()
+        return
+    args.handler(args)
 
 
 if __name__ == "__main__":
-    run_app()
+    main()
@@ -0,0 +1,442 @@
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import uuid
+from collections.abc import Collection, Iterator
+from pathlib import Path
+from typing import Any, Protocol
+
+from logger import logger, _
+
+
+SQLITE_SUFFIXES = {".db", ".sqlite", ".sqlite3"}
+# A shard with failed jobs is released for another node until it has been
+# claimed this many times; a new run of the batch retries it once more.
+MAX_SHARD_ATTEMPTS = 3
+META_WAIT_SECONDS = 10.0
+
+
+class Manifest(Protocol):
+    def prepare(self, fingerprint: str, shard_count: int) -> None: ...
+
+    def claim(self, node: str, lease: float) -> int | None: ...
+
+    def renew(self, shard_id: int, node: str, lease: float) -> bool: ...
+
+    def finish(
+        self, shard_id: int, node: str, failed: bool = False
+    ) -> bool: ...
+
+    def get_done_jobs(self, job_keys: Collection[str]) -> set[str]: ...
+
+    def mark_done(
+        self,
+        job_keys: Collection[str],
+        shard_id: int,
+        node: str,
+        error: str | None = None,
+    ) -> None: ...
+
+    def is_finished(self) -> bool: ...
+
+    def get_summary(self) -> dict[str, int]: ...
+
+
+def check_fingerprint(
+    meta: dict[str, Any],
+    fingerprint: str,
+    shard_count: int,
+) -> None:
+    if meta != {"fingerprint": fingerprint, "shard_count": shard_count}:
+        raise ValueError(
+            _("Manifest was created for another job list: {meta}").format(
+                meta=meta
+            )
+        )
+
+
+class SqliteManifest:
+    def __init__(self, path: Path, timeout: float = 60.0) -> None:
+        self.path = path
+        self.timeout = timeout
+        self.connection: sqlite3.Connection | None = None
+
+    def get_connection(self) -> sqlite3.Connection:
+        # Every node keeps one connection; nodes started with --processes
+        # open their own after the fork.
+        if self.connection is None:
+            self.connection = sqlite3.connect(
+                self.path,
+                timeout=self.timeout,
+                isolation_level=None,
+            )
+            # Readers do not wait for the node that holds the write lock.
+            self.connection.execute("PRAGMA journal_mode=WAL")
+        return self.connection
+
+    @contextlib.contextmanager
+    def transaction(
+        self, immediate: bool = True
+    ) -> Iterator[sqlite3.Connection]:
+        # Writes take the lock up front, so a read-modify-write such as claim
+        # cannot fail on lock upgrade; reads use a deferred transaction.
+        connection = self.get_connection()
+        connection.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def prepare(self, fingerprint: str, shard_count: int) -> None:
+        with self.transaction() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS meta ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS shards ("
+                "id INTEGER PRIMARY KEY, state TEXT NOT NULL, owner TEXT, "
+                "lease_until REAL NOT NULL DEFAULT 0, "
+                "attempts INTEGER NOT NULL DEFAULT 0)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_key TEXT PRIMARY KEY, shard_id INTEGER NOT NULL, "
+                "node TEXT NOT NULL, error TEXT, finished_at REAL NOT NULL)"
+            )
+            row = connection.execute(
+                "SELECT value FROM meta WHERE key = 'meta'"
+            ).fetchone()
+            if row is not None:
+                check_fingerprint(json.loads(row[0]), fingerprint, shard_count)
+                connection.execute(
+                    "UPDATE shards SET state = 'pending', owner = NULL, "
+                    "lease_until = 0 WHERE state = 'done' AND id IN "
+                    "(SELECT shard_id FROM jobs WHERE error IS NOT NULL)"
+                )
+                return
+            meta = {"fingerprint": fingerprint, "shard_count": shard_count}
+            connection.execute(
+                "INSERT INTO meta (key, value) VALUES ('meta', ?)",
+                (json.dumps(meta),),
+            )
+            connection.executemany(
+                "INSERT INTO shards (id, state) VALUES (?, 'pending')",
+                [(shard_id,) for shard_id in range(shard_count)],
+            )
+        logger.info(
+            _("Manifest created: {path}").format(path=self.path),
+        )
+
+    def claim(self, node: str, lease: float) -> int | None:
+        now = time.time()
+        with self.transaction() as connection:
+            row = connection.execute(
+                "SELECT id, state, owner FROM shards "
+                "WHERE state = 'pending' "
+                "OR (state = 'claimed' AND lease_until < ?) "
+                "ORDER BY id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            shard_id, state, owner = row
+            connection.execute(
+                "UPDATE shards SET state = 'claimed', owner = ?, "
+                "lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                (node, now + lease, shard_id),
+            )
+        if state == "claimed":
+            logger.warning(
+                _("Shard {shard_id} reclaimed from {owner}").format(
+                    shard_id=shard_id, owner=owner
+                )
+            )
+        return shard_id
+
+    def renew(self, shard_id: int, node: str, lease: float) -> bool:
+        with self.transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE shards SET lease_until = ? "
+                "WHERE id = ? AND owner = ? AND state = 'claimed'",
+                (time.time() + lease, shard_id, node),
+            )
+        return cursor.rowcount == 1
+
+    def finish(self, shard_id: int, node: str, failed: bool = False) -> bool:
+        with self.transaction() as connection:
+            row = connection.execute(
+                "SELECT attempts FROM shards "
+                "WHERE id = ? AND owner = ? AND state = 'claimed'",
+                (shard_id, node),
+            ).fetchone()
+            if row is None:
+                return False
+            if failed and row[0] < MAX_SHARD_ATTEMPTS:
+                connection.execute(
+                    "UPDATE shards SET state = 'pending', owner = NULL, "
+                    "lease_until = 0 WHERE id = ?",
+                    (shard_id,),
+                )
+                return False
+            connection.execute(
+                "UPDATE shards SET state = 'done' WHERE id = ?",
+                (shard_id,),
+            )
+        return True
+
+    def get_done_jobs(self, job_keys: Collection[str]) -> set[str]:
+        with self.transaction(immediate=False) as connection:
+            rows = connection.execute(
+                "SELECT job_key FROM jobs WHERE error IS NULL "
+                "AND job_key IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(job_keys)),),
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def mark_done(
+        self,
+        job_keys: Collection[str],
+        shard_id: int,
+        node: str,
+        error: str | None = None,
+    ) -> None:
+        finished_at = time.time()
+        with self.transaction() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO jobs "
+                "(job_key, shard_id, node, error, finished_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (job_key, shard_id, node, error, finished_at)
+                    for job_key in job_keys
+                ],
+            )
+
+    def is_finished(self) -> bool:
+        with self.transaction(immediate=False) as connection:
+            row = connection.execute(
+                "SELECT COUNT(*) FROM shards WHERE state != 'done'"
+            ).fetchone()
+        return row[0] == 0
+
+    def get_summary(self) -> dict[str, int]:
+        with self.transaction(immediate=False) as connection:
+            shards, shards_done = connection.execute(
+                "SELECT COUNT(*), COUNT(*) FILTER (WHERE state = 'done') "
+                "FROM shards"
+            ).fetchone()
+            jobs_done, jobs_failed = connection.execute(
+                "SELECT COUNT(*), COUNT(error) FROM jobs"
+            ).fetchone()
+        return {
+            "shards": shards,
+            "shards_done": shards_done,
+            "jobs_done": jobs_done - jobs_failed,
+            "jobs_failed": jobs_failed,
+        }
+
+
+class LockDirManifest:
+    # Every shard lease is a file "<shard>.<generation>.lock" created with
+    # os.link, which fails atomically when the file already exists, also on
+    # network filesystems; where hard links are not supported, O_EXCL is used
+    # instead. Taking over an expired lease means creating the
+    # next generation, so exactly one node wins it and the previous owner
+    # notices the newer generation on its next renew.
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.shards_dir = path / "shards"
+        self.jobs_dir = path / "jobs"
+        self.shard_count = 0
+        self.claims: dict[int, int] = {}
+
+    def write(self, path: Path, content: dict[str, Any]) -> None:
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+        tmp_path.write_text(json.dumps(content), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def write_once(self, path: Path, content: dict[str, Any]) -> bool:
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+        tmp_path.write_text(json.dumps(content), encoding="utf-8")
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            return False
+        except OSError:
+            # Some shares, e.g. SMB on macOS and many NAS, have no hard links.
+            return self.create_exclusively(path, content)
+        finally:
+            tmp_path.unlink()
+        return True
+
+    def create_exclusively(self, path: Path, content: dict[str, Any]) -> bool:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(json.dumps(content))
+        return True
+
+    def read(self, path: Path) -> dict[str, Any] | None:
+        # A file created with O_EXCL may still be empty or partly written.
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def get_lock_path(self, shard_id: int, generation: int) -> Path:
+        return self.shards_dir / f"{shard_id:05d}.{generation:06d}.lock"
+
+    def get_done_path(self, shard_id: int) -> Path:
+        return self.shards_dir / f"{shard_id:05d}.done"
+
+    def get_job_path(self, job_key: str) -> Path:
+        digest = hashlib.sha1(job_key.encode("utf-8")).hexdigest()
+        return self.jobs_dir / f"{digest}.json"
+
+    def get_generation(self, shard_id: int) -> int:
+        return max(
+            (
+                int(path.name.split(".")[1])
+                for path in self.shards_dir.glob(f"{shard_id:05d}.*.lock")
+            ),
+            default=0,
+        )
+
+    def prepare(self, fingerprint: str, shard_count: int) -> None:
+        self.shards_dir.mkdir(parents=True, exist_ok=True)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        meta_path = self.path / "manifest.json"
+        meta = {"fingerprint": fingerprint, "shard_count": shard_count}
+        if self.write_once(meta_path, meta):
+            logger.info(
+                _("Manifest created: {path}").format(path=self.path),
+            )
+        # Another node may still be writing the manifest it has just created.
+        deadline = time.monotonic() + META_WAIT_SECONDS
+        while (
+            current_meta := self.read(meta_path)
+        ) is None and time.monotonic() < deadline:
+            time.sleep(0.1)
+        check_fingerprint(current_meta or {}, fingerprint, shard_count)
+        self.shard_count = shard_count
+        for path in self.jobs_dir.glob("*.json"):
+            job = self.read(path)
+            if job and job.get("error"):
+                self.get_done_path(job["shard_id"]).unlink(missing_ok=True)
+
+    def claim(self, node: str, lease: float) -> int | None:
+        now = time.time()
+        for shard_id in range(self.shard_count):
+            if self.get_done_path(shard_id).exists():
+                continue
+            generation = self.get_generation(shard_id)
+            owner = None
+            if generation:
+                lock = self.read(self.get_lock_path(shard_id, generation))
+                if lock is None or lock["lease_until"] >= now:
+                    continue
+                owner = lock["node"]
+            lock_path = self.get_lock_path(shard_id, generation + 1)
+            lock = {"node": node, "lease_until": now + lease}
+            if not self.write_once(lock_path, lock):
+                continue
+            if self.get_done_path(shard_id).exists():
+                continue
+            if owner:
+                logger.warning(
+                    _("Shard {shard_id} reclaimed from {owner}").format(
+                        shard_id=shard_id, owner=owner
+                    )
+                )
+            self.claims[shard_id] = generation + 1
+            return shard_id
+        return None
+
+    def renew(self, shard_id: int, node: str, lease: float) -> bool:
+        generation = self.claims.get(shard_id)
+        if generation is None or generation != self.get_generation(shard_id):
+            self.claims.pop(shard_id, None)
+            return False
+        self.write(
+            self.get_lock_path(shard_id, generation),
+            {"node": node, "lease_until": time.time() + lease},
+        )
+        return True
+
+    def finish(self, shard_id: int, node: str, failed: bool = False) -> bool:
+        generation = self.claims.pop(shard_id, None)
+        if generation is None or generation != self.get_generation(shard_id):
+            return False
+        done = not failed or generation >= MAX_SHARD_ATTEMPTS
+        if done:
+            self.write_once(self.get_done_path(shard_id), {"node": node})
+        # An expired lease lets the shard be claimed again at once, when it
+        # is released for a retry or reopened by a new run.
+        self.write(
+            self.get_lock_path(shard_id, generation),
+            {"node": None, "lease_until": 0},
+        )
+        return done
+
+    def get_done_jobs(self, job_keys: Collection[str]) -> set[str]:
+        done_jobs = set()
+        for job_key in job_keys:
+            job = self.read(self.get_job_path(job_key))
+            if job is not None and not job.get("error"):
+                done_jobs.add(job_key)
+        return done_jobs
+
+    def mark_done(
+        self,
+        job_keys: Collection[str],
+        shard_id: int,
+        node: str,
+        error: str | None = None,
+    ) -> None:
+        finished_at = time.time()
+        for job_key in job_keys:
+            self.write(
+                self.get_job_path(job_key),
+                {
+                    "job_key": job_key,
+                    "shard_id": shard_id,
+                    "node": node,
+                    "error": error,
+                    "finished_at": finished_at,
+                },
+            )
+
+    def is_finished(self) -> bool:
+        return all(
+            self.get_done_path(shard_id).exists()
+            for shard_id in range(self.shard_count)
+        )
+
+    def get_summary(self) -> dict[str, int]:
+        jobs = [self.read(path) or {} for path in self.jobs_dir.glob("*.json")]
+        jobs_failed = sum(1 for job in jobs if job.get("error"))
+        return {
+            "shards": self.shard_count,
+            "shards_done": sum(
+                1
+                for shard_id in range(self.shard_count)
+                if self.get_done_path(shard_id).exists()
+            ),
+            "jobs_done": len(jobs) - jobs_failed,
+            "jobs_failed": jobs_failed,
+        }
+
+
+def open_manifest(path: Path) -> Manifest:
+    if path.suffix in SQLITE_SUFFIXES:
+        return SqliteManifest(path)
+    return LockDirManifest(path)
@@ -0,0 +1,429 @@
+import io
+from collections.abc import Iterator, Mapping
+from pathlib import Path
+from typing import Any
+
+from docx.document import Document as DocumentObject
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import qn
+from docx.shared import Length
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+from docx.text.run import Run
+
+from logger import _
+
+try:
+    from fpdf import FPDF
+    from fpdf.errors import FPDFException
+    from fpdf.fonts import FontFace
+except ImportError:
+    FPDF = None  # type: ignore
+
+
+NATIVE_FONT_FAMILY = "native"
+NATIVE_FONT_STYLES = {
+    "regular": "",
+    "bold": "B",
+    "italic": "I",
+    "bold_italic": "BI",
+}
+DEFAULT_FONT_SIZE = 11.0
+LINE_HEIGHT = 1.15
+EMU_PER_PT = 12700
+
+BODY_TAGS = {qn("w:p"), qn("w:tbl"), qn("w:sectPr")}
+PARAGRAPH_TAGS = {
+    qn("w:pPr"),
+    qn("w:r"),
+    qn("w:bookmarkStart"),
+    qn("w:bookmarkEnd"),
+    qn("w:proofErr"),
+}
+RUN_TAGS = {
+    qn("w:rPr"),
+    qn("w:t"),
+    qn("w:br"),
+    qn("w:cr"),
+    qn("w:drawing"),
+    qn("w:lastRenderedPageBreak"),
+}
+TABLE_TAGS = {qn("w:tblPr"), qn("w:tblGrid"), qn("w:tr")}
+ROW_TAGS = {qn("w:trPr"), qn("w:tblPrEx"), qn("w:tc")}
+CELL_TAGS = {qn("w:tcPr"), qn("w:p")}
+UNSUPPORTED_PROPERTIES = {
+    qn("w:numPr"): "lists",
+    qn("w:framePr"): "frames",
+    qn("w:tabs"): "tab stops",
+    qn("w:gridSpan"): "merged cells",
+    qn("w:vMerge"): "merged cells",
+    qn("w:hMerge"): "merged cells",
+}
+
+HEADER_FOOTER_PARTS = [
+    "header",
+    "footer",
+    "first_page_header",
+    "first_page_footer",
+    "even_page_header",
+    "even_page_footer",
+]
+# Image formats fpdf2 can decode; Word also embeds EMF and WMF pictures.
+IMAGE_CONTENT_TYPES = {"image/png", "image/jpeg", "image/gif", "image/bmp"}
+
+ALIGNMENTS = {
+    WD_ALIGN_PARAGRAPH.CENTER: "CENTER",
+    WD_ALIGN_PARAGRAPH.RIGHT: "RIGHT",
+    WD_ALIGN_PARAGRAPH.JUSTIFY: "JUSTIFY",
+}
+CORE_FONTS = {
+    "times": "times",
+    "georgia": "times",
+    "cambria": "times",
+    "courier": "courier",
+    "consolas": "courier",
+    "mono": "courier",
+}
+
+
+class UnsupportedDocument(Exception):
+    pass
+
+
+def check_children(element: Any, allowed_tags: set[str], name: str) -> None:
+    for child in element:
+        if child.tag not in allowed_tags:
+            raise UnsupportedDocument(
+                _("{tag} in {name}").format(
+                    tag=child.tag.split("}")[-1], name=name
+                )
+            )
+
+
+def check_supported(doc: DocumentObject) -> None:
+    if FPDF is None:
+        raise UnsupportedDocument(_("fpdf2 is not installed"))
+    if len(doc.sections) > 1:
+        raise UnsupportedDocument(_("several sections"))
+    section = doc.sections[0]
+    for part_name in HEADER_FOOTER_PARTS:
+        part = getattr(section, part_name)
+        if part.is_linked_to_previous:
+            continue
+        if (
+            "".join(part._element.itertext()).strip()
+            or part._element.find(f".//{qn('w:drawing')}") is not None
+        ):
+            raise UnsupportedDocument(_("headers and footers"))
+
+    body = doc.element.body
+    check_children(body, BODY_TAGS, "body")
+    for element in body.iter():
+        if element.tag in UNSUPPORTED_PROPERTIES:
+            raise UnsupportedDocument(UNSUPPORTED_PROPERTIES[element.tag])
+        if element.tag == qn("w:p"):
+            check_children(element, PARAGRAPH_TAGS, "paragraph")
+        elif element.tag == qn("w:r"):
+            check_children(element, RUN_TAGS, "run")
+        elif element.tag == qn("w:tbl"):
+            check_children(element, TABLE_TAGS, "table")
+        elif element.tag == qn("w:tr"):
+            check_children(element, ROW_TAGS, "table row")
+        elif element.tag == qn("w:tc"):
+            check_children(element, CELL_TAGS, "table cell")
+            if element.find(f".//{qn('w:drawing')}") is not None:
+                raise UnsupportedDocument(_("images in table cells"))
+        elif (
+            element.tag == qn("w:cols")
+            and int(element.get(qn("w:num"), 1)) > 1
+        ):
+            raise UnsupportedDocument(_("columns"))
+        elif element.tag == qn("w:br") and element.get(qn("w:type")):
+            raise UnsupportedDocument(_("page breaks"))
+        elif element.tag == qn("w:drawing"):
+            if element.find(qn("wp:inline")) is None:
+                raise UnsupportedDocument(_("floating images"))
+    for paragraph in doc.paragraphs:
+        if get_images(paragraph) and paragraph.text.strip():
+            raise UnsupportedDocument(_("images inside text"))
+        if get_style_value(paragraph, get_style_numbering) is not None:
+            raise UnsupportedDocument(UNSUPPORTED_PROPERTIES[qn("w:numPr")])
+
+
+def to_pt(length: Length | None, default: float = 0.0) -> float:
+    return length.pt if length is not None else default
+
+
+def get_style_value(paragraph: Paragraph, getter: Any) -> Any:
+    style = paragraph.style
+    while style is not None:
+        value = getter(style)
+        if value is not None:
+            return value
+        style = style.base_style
+    return None
+
+
+def get_style_numbering(style: Any) -> Any:
+    return style.element.find(f"{qn('w:pPr')}/{qn('w:numPr')}")
+
+
+def get_run_value(run: Run, paragraph: Paragraph, name: str) -> Any:
+    value = getattr(run.font, name)
+    if value is None:
+        value = get_style_value(
+            paragraph, lambda style: getattr(style.font, name)
+        )
+    return value
+
+
+def get_paragraph_value(paragraph: Paragraph, name: str) -> Any:
+    value = getattr(paragraph.paragraph_format, name)
+    if value is None:
+        value = get_style_value(
+            paragraph, lambda style: getattr(style.paragraph_format, name)
+        )
+    return value
+
+
+def get_images(paragraph: Paragraph) -> list[tuple[bytes, float, float]]:
+    images = []
+    for inline in paragraph._p.iter(qn("wp:inline")):
+        extent = inline.find(qn("wp:extent"))
+        blip = next(inline.iter(qn("a:blip")), None)
+        if extent is None or blip is None:
+            raise UnsupportedDocument(_("drawings"))
+        image_part = paragraph.part.related_parts[blip.get(qn("r:embed"))]
+        if image_part.content_type not in IMAGE_CONTENT_TYPES:
+            raise UnsupportedDocument(
+                _("{content_type} images").format(
+                    content_type=image_part.content_type
+                )
+            )
+        images.append(
+            (
+                image_part.blob,
+                int(extent.get("cx")) / EMU_PER_PT,
+                int(extent.get("cy")) / EMU_PER_PT,
+            )
+        )
+    return images
+
+
+def iter_body(doc: DocumentObject) -> Iterator[Paragraph | Table]:
+    for element in doc.element.body:
+        if element.tag == qn("w:p"):
+            yield Paragraph(element, doc._body)
+        elif element.tag == qn("w:tbl"):
+            yield Table(element, doc._body)
+
+
+class NativeRenderer:
+    def __init__(self, fonts: Mapping[str, str] | None = None) -> None:
+        self.fonts = {
+            style: Path(path) for style, path in (fonts or {}).items() if path
+        }
+        if not self.fonts.get("regular", Path()).is_file():
+            self.fonts = {}
+
+    def create_pdf(self, doc: DocumentObject) -> Any:
+        section = doc.sections[0]
+        pdf = FPDF(
+            unit="pt",
+            format=(to_pt(section.page_width), to_pt(section.page_height)),
+        )
+        pdf.set_margins(
+            to_pt(section.left_margin),
+            to_pt(section.top_margin),
+            to_pt(section.right_margin),
+        )
+        pdf.set_auto_page_break(True, margin=to_pt(section.bottom_margin))
+        self.add_fonts(pdf)
+        pdf.add_page()
+        return pdf
+
+    def add_fonts(self, pdf: Any) -> None:
+        if not self.fonts:
+            return
+        # Styles without their own file are drawn with the regular one.
+        for style_name, style in NATIVE_FONT_STYLES.items():
+            path = self.fonts.get(style_name, self.fonts["regular"])
+            if not path.is_file():
+                path = self.fonts["regular"]
+            pdf.add_font(NATIVE_FONT_FAMILY, style, str(path))
+
+    def get_font_family(self, font_name: str | None) -> str:
+        if self.fonts:
+            return NATIVE_FONT_FAMILY
+        font_name = (font_name or "").lower()
+        for name, family in CORE_FONTS.items():
+            if name in font_name:
+                return family
+        return "helvetica"
+
+    def get_font_style(self, run: Run, paragraph: Paragraph) -> str:
+        style = ""
+        if get_run_value(run, paragraph, "bold"):
+            style += "B"
+        if get_run_value(run, paragraph, "italic"):
+            style += "I"
+        if get_run_value(run, paragraph, "underline"):
+            style += "U"
+        return style
+
+    def set_run_font(self, pdf: Any, run: Run, paragraph: Paragraph) -> None:
+        size = get_run_value(run, paragraph, "size")
+        pdf.set_font(
+            self.get_font_family(get_run_value(run, paragraph, "name")),
+            self.get_font_style(run, paragraph),
+            to_pt(size, DEFAULT_FONT_SIZE),
+        )
+        color = run.font.color.rgb if run.font.color.type else None
+        pdf.set_text_color(*(color or (0, 0, 0)))
+
+    def check_text(self, text: str) -> None:
+        if self.fonts:
+            return
+        try:
+            text.encode("cp1252")
+        except UnicodeEncodeError:
+            raise UnsupportedDocument(
+                _("characters that need native_fonts")
+            ) from None
+
+    def render_paragraph(self, pdf: Any, paragraph: Paragraph) -> None:
+        space_before = get_paragraph_value(paragraph, "space_before")
+        space_after = get_paragraph_value(paragraph, "space_after")
+        line_spacing = get_paragraph_value(paragraph, "line_spacing")
+        left_indent = get_paragraph_value(paragraph, "left_indent")
+        first_line_indent = get_paragraph_value(paragraph, "first_line_indent")
+        align = ALIGNMENTS.get(
+            get_paragraph_value(paragraph, "alignment"), "LEFT"
+        )
+        line_height = LINE_HEIGHT * (
+            line_spacing if isinstance(line_spacing, float) else 1
+        )
+
+        images = get_images(paragraph)
+        if images:
+            pdf.ln(to_pt(space_before))
+            for blob, width, height in images:
+                try:
+                    pdf.image(
+                        io.BytesIO(blob),
+                        x={"CENTER": "C", "RIGHT": "R"}.get(align),
+                        w=width,
+                        h=height,
+                    )
+                except Exception as e:
+                    # PIL raises several error types for images it cannot
+                    # decode, e.g. UnidentifiedImageError.
+                    raise UnsupportedDocument(
+                        _("image that cannot be decoded: {error}").format(
+                            error=e
+                        )
+                    ) from e
+            pdf.ln(to_pt(space_after))
+            return
+
+        runs = [run for run in paragraph.runs if run.text]
+        if not runs:
+            size = get_style_value(paragraph, lambda style: style.font.size)
+            font_size = to_pt(size, DEFAULT_FONT_SIZE)
+            pdf.ln(
+                (to_pt(space_before))
+                + font_size * line_height
+                + (to_pt(space_after))
+            )
+            return
+
+        with pdf.text_columns(
+            text_align=align,
+            line_height=line_height,
+            l_margin=pdf.l_margin + (to_pt(left_indent)),
+        ) as columns:
+            with columns.paragraph(
+                top_margin=to_pt(space_before),
+                bottom_margin=to_pt(space_after),
+                first_line_indent=(to_pt(first_line_indent)),
+            ) as pdf_paragraph:
+                for run in runs:
+                    self.check_text(run.text)
+                    self.set_run_font(pdf, run, paragraph)
+                    pdf_paragraph.write(run.text.replace("\t", " "))
+
+    def get_cell_style(self, cell: Any) -> tuple[Any, str]:
+        # A table cell is drawn with one font and alignment, so cells that
+        # mix them are converted with docx2pdf.
+        faces = set()
+        alignments = set()
+        for paragraph in cell.paragraphs:
+            runs = [run for run in paragraph.runs if run.text]
+            if runs:
+                alignments.add(
+                    ALIGNMENTS.get(
+                        get_paragraph_value(paragraph, "alignment"), "LEFT"
+                    )
+                )
+            for run in runs:
+                color = run.font.color.rgb if run.font.color.type else None
+                faces.add(
+                    (
+                        self.get_font_family(
+                            get_run_value(run, paragraph, "name")
+                        ),
+                        self.get_font_style(run, paragraph),
+                        to_pt(
+                            get_run_value(run, paragraph, "size"),
+                            DEFAULT_FONT_SIZE,
+                        ),
+                        tuple(color or (0, 0, 0)),
+                    )
+                )
+        if len(faces) > 1:
+            raise UnsupportedDocument(_("mixed formatting in table cells"))
+        if len(alignments) > 1:
+            raise UnsupportedDocument(_("mixed alignment in table cells"))
+        if not faces:
+            return None, "LEFT"
+        family, emphasis, size, color = faces.pop()
+        style = FontFace(
+            family=family, emphasis=emphasis, size_pt=size, color=color
+        )
+        return style, alignments.pop()
+
+    def render_table(self, pdf: Any, table: Table) -> None:
+        widths = [to_pt(column.width) for column in table.columns]
+        if not all(widths):
+            widths = [pdf.epw / len(table.columns)] * len(table.columns)
+        with pdf.table(
+            col_widths=widths,
+            width=min(sum(widths), pdf.epw),
+            first_row_as_headings=False,
+            line_height=DEFAULT_FONT_SIZE * LINE_HEIGHT,
+            align="LEFT",
+        ) as pdf_table:
+            for row in table.rows:
+                pdf_row = pdf_table.row()
+                for cell in row.cells:
+                    text = "\n".join(
+                        paragraph.text for paragraph in cell.paragraphs
+                    )
+                    self.check_text(text)
+                    style, align = self.get_cell_style(cell)
+                    pdf_row.cell(text, align=align, style=style)
+
+    def render(self, doc: DocumentObject, pdf_file_path: Path) -> None:
+        pdf = self.create_pdf(doc)
+        pdf.set_font(self.get_font_family(None), "", DEFAULT_FONT_SIZE)
+        try:
+            for block in iter_body(doc):
+                if isinstance(block, Table):
+                    self.render_table(pdf, block)
+                else:
+                    self.render_paragraph(pdf, block)
+            pdf.output(str(pdf_file_path))
+        except FPDFException as e:
+            # Layouts fpdf2 cannot place, e.g. a word wider than its cell
+            # ("Not enough horizontal space to render a single character").
+            raise UnsupportedDocument(f"{e}") from e
@@ -0,0 +1,384 @@
+import copy
+import io
+import json
+import os
+import uuid
+from collections.abc import Mapping
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from docx import Document
+from docx.document import Document as DocumentObject
+from docx.shared import RGBColor
+from docx.text.run import Run
+
+from logger import logger, _
+from analyzer import iter_document_paragraphs, iter_placeholder_matches
+from native import FPDF, NativeRenderer, UnsupportedDocument, to_pt
+from utils import convert_docx_template_to_pdf, get_file_hash
+
+try:
+    import pdfplumber
+    from pypdf import PdfReader, PdfWriter
+    from pypdf.generic import ContentStream, NumberObject
+except ImportError:
+    pdfplumber = None  # type: ignore
+
+
+SKELETON_DIR_NAME = ".skeletons"
+# Part of the skeleton file names, so skeletons built by an older version
+# are replaced.
+SKELETON_VERSION = 2
+# Placeholders are drawn in a color that templates do not use, so their
+# glyphs can be found on the converted pages and made invisible in the
+# skeleton.
+HIDDEN_COLOR = RGBColor(0xFF, 0xFE, 0xFF)
+HIDDEN_COLOR_VALUES = (1.0, 0xFE / 0xFF, 1.0)
+COLOR_TOLERANCE = 0.002
+FILL_COLOR_OPERATORS = {b"g", b"rg", b"k", b"sc", b"scn", b"cs"}
+TEXT_OPERATORS = {b"Tj", b"TJ", b"'", b'"'}
+# Distances in points that are treated as rounding errors of the converter.
+LINE_TOLERANCE = 1.0
+WIDTH_TOLERANCE = 0.5
+
+
+class UnsupportedOverlay(Exception):
+    pass
+
+
+@dataclass
+class Slot:
+    name: str
+    page: int
+    x: float
+    baseline: float
+    right: float
+    size: float
+    font: str
+    style: str
+
+
+@dataclass
+class Skeleton:
+    template_hash: str
+    path: Path
+    pages: list[tuple[float, float]] = field(default_factory=list)
+    slots: list[Slot] = field(default_factory=list)
+    error: str | None = None
+
+
+def hide_placeholders(doc: DocumentObject) -> set[str]:
+    # Every placeholder gets a run of its own in the hidden color, so the
+    # office converter lays the page out exactly as with the placeholder text,
+    # which is then made invisible in the skeleton.
+    names = set()
+    for part, paragraph in iter_document_paragraphs(doc):
+        if part != "body":
+            continue
+        for run in list(paragraph.runs):
+            text = run.text
+            matches = list(iter_placeholder_matches(text))
+            if not matches:
+                continue
+            segments = []
+            position = 0
+            for match in matches:
+                segments.append((text[position : match.start()], False))
+                segments.append((match.group(0), True))
+                names.add(match.group(1))
+                position = match.end()
+            segments.append((text[position:], False))
+            element = run._r
+            for segment, hidden in segments:
+                if not segment:
+                    continue
+                new_element = copy.deepcopy(run._r)
+                element.addnext(new_element)
+                element = new_element
+                new_run = Run(new_element, paragraph)
+                new_run.text = segment
+                if hidden:
+                    new_run.font.color.rgb = HIDDEN_COLOR
+            run._r.getparent().remove(run._r)
+    return names
+
+
+def is_hidden_color(color: Any) -> bool:
+    if not isinstance(color, (tuple, list)) or len(color) != 3:
+        return False
+    return all(
+        abs(float(value) - hidden_value) <= COLOR_TOLERANCE
+        for value, hidden_value in zip(color, HIDDEN_COLOR_VALUES)
+    )
+
+
+def is_hidden(char: Mapping[str, Any]) -> bool:
+    return is_hidden_color(char.get("non_stroking_color"))
+
+
+def is_same_line(char: Mapping[str, Any], other: Mapping[str, Any]) -> bool:
+    return (
+        char["top"] < other["bottom"] - LINE_TOLERANCE
+        and char["bottom"] > other["top"] + LINE_TOLERANCE
+    )
+
+
+def get_box_right(page: Any, last: Mapping[str, Any], right: float) -> float:
+    # A placeholder may grow until the next visible text or placeholder on
+    # its line, the next table border or the page margin.
+    for char in page.chars:
+        if (
+            char["x0"] >= last["x1"] - 0.1
+            and is_same_line(char, last)
+            and (char["text"].strip() or is_hidden(char))
+        ):
+            right = min(right, char["x0"])
+    for edge in page.edges:
+        if (
+            edge["orientation"] == "v"
+            and edge["x0"] >= last["x1"] - 0.1
+            and edge["top"] <= last["top"] + LINE_TOLERANCE
+            and edge["bottom"] >= last["bottom"] - LINE_TOLERANCE
+        ):
+            right = min(right, edge["x0"])
+    return right
+
+
+def get_font_style(font_name: str) -> str:
+    style = ""
+    if "bold" in font_name.lower():
+        style += "B"
+    if "italic" in font_name.lower() or "oblique" in font_name.lower():
+        style += "I"
+    return style
+
+
+def find_slots(page: Any, page_number: int, right_margin: float) -> list[Slot]:
+    slots = []
+    chars = page.chars
+    start = 0
+    while start < len(chars):
+        if not is_hidden(chars[start]):
+            start += 1
+            continue
+        end = start + 1
+        while (
+            end < len(chars)
+            and is_hidden(chars[end])
+            and is_same_line(chars[end], chars[start])
+        ):
+            end += 1
+        text = "".join(char["text"] for char in chars[start:end])
+        for match in iter_placeholder_matches(text):
+            first = chars[start + match.start()]
+            last = chars[start + match.end() - 1]
+            slots.append(
+                Slot(
+                    name=match.group(1),
+                    page=page_number,
+                    x=first["x0"],
+                    baseline=page.height - first["matrix"][5],
+                    right=get_box_right(page, last, page.width - right_margin),
+                    size=first["size"],
+                    font=first["fontname"],
+                    style=get_font_style(first["fontname"]),
+                )
+            )
+        start = end
+    return slots
+
+
+def make_hidden_text_invisible(probe_path: Path, skeleton_path: Path) -> None:
+    reader = PdfReader(probe_path)
+    writer = PdfWriter()
+    for page in reader.pages:
+        content = ContentStream(page.get_contents(), reader)
+        operations = []
+        hidden = False
+        render_mode: Any = NumberObject(0)
+        state_stack = []
+        for operands, operator in content.operations:
+            if operator == b"q":
+                state_stack.append((hidden, render_mode))
+            elif operator == b"Q":
+                hidden, render_mode = (
+                    state_stack.pop()
+                    if state_stack
+                    else (False, NumberObject(0))
+                )
+            elif operator in FILL_COLOR_OPERATORS:
+                hidden = is_hidden_color(operands)
+            elif operator == b"Tr":
+                render_mode = operands[0]
+            elif hidden and operator in TEXT_OPERATORS:
+                # The hidden glyphs are kept in the invisible render mode, so
+                # they still advance the text position of the following text.
+                operations.append(([NumberObject(3)], b"Tr"))
+                operations.append((operands, operator))
+                operations.append(([render_mode], b"Tr"))
+                continue
+            operations.append((operands, operator))
+        content.operations = operations
+        page.replace_contents(content)
+        writer.add_page(page)
+    # Batch nodes may build the same skeleton at once, so it is moved into
+    # place only when complete.
+    tmp_skeleton_path = skeleton_path.with_suffix(f".{uuid.uuid4().hex}.pdf")
+    writer.write(tmp_skeleton_path)
+    os.replace(tmp_skeleton_path, skeleton_path)
+
+
+def build_skeleton(
+    docx_template_path: Path,
+    template_hash: str,
+    skeleton_path: Path,
+) -> Skeleton:
+    skeleton = Skeleton(template_hash=template_hash, path=skeleton_path)
+    doc = Document(str(docx_template_path))
+    names = hide_placeholders(doc)
+    right_margin = max(to_pt(section.right_margin) for section in doc.sections)
+    build_id = uuid.uuid4().hex
+    hidden_docx_path = skeleton_path.with_suffix(f".{build_id}.docx")
+    probe_path = skeleton_path.with_suffix(f".{build_id}.probe.pdf")
+    doc.save(str(hidden_docx_path))
+    try:
+        convert_docx_template_to_pdf(
+            docx_template_path=hidden_docx_path,
+            pdf_file_path=probe_path,
+            replacement_words={},
+        )
+        with pdfplumber.open(probe_path) as pdf:
+            for page_number, page in enumerate(pdf.pages):
+                skeleton.pages.append((page.width, page.height))
+                skeleton.slots += find_slots(page, page_number, right_margin)
+        make_hidden_text_invisible(probe_path, skeleton_path)
+    finally:
+        hidden_docx_path.unlink(missing_ok=True)
+        probe_path.unlink(missing_ok=True)
+    missing_names = names - {slot.name for slot in skeleton.slots}
+    if missing_names:
+        skeleton.error = _("placeholders not found on pages: {names}").format(
+            names=", ".join(sorted(missing_names))
+        )
+    return skeleton
+
+
+@lru_cache(maxsize=64)
+def get_skeleton(docx_template_path: Path, template_hash: str) -> Skeleton:
+    skeleton_dir = docx_template_path.parent / SKELETON_DIR_NAME
+    skeleton_path = (
+        skeleton_dir
+        / f"{docx_template_path.name}.{template_hash}.v{SKELETON_VERSION}.pdf"
+    )
+    layout_path = skeleton_path.with_suffix(".json")
+    if layout_path.exists() and skeleton_path.exists():
+        layout = json.loads(layout_path.read_text(encoding="utf-8"))
+        return Skeleton(
+            template_hash=template_hash,
+            path=skeleton_path,
+            pages=[tuple(size) for size in layout["pages"]],
+            slots=[Slot(**slot) for slot in layout["slots"]],
+            error=layout["error"],
+        )
+
+    skeleton_dir.mkdir(exist_ok=True)
+    # Skeletons of previous versions of the template are not needed anymore.
+    for old_path in skeleton_dir.glob(f"{docx_template_path.name}.*"):
+        if not old_path.name.startswith(skeleton_path.stem):
+            old_path.unlink(missing_ok=True)
+    logger.info(
+        _("Building PDF skeleton for {path}").format(path=docx_template_path)
+    )
+    skeleton = build_skeleton(docx_template_path, template_hash, skeleton_path)
+    tmp_layout_path = layout_path.with_suffix(f".{uuid.uuid4().hex}.json")
+    tmp_layout_path.write_text(
+        json.dumps(
+            {
+                "pages": skeleton.pages,
+                "slots": [asdict(slot) for slot in skeleton.slots],
+                "error": skeleton.error,
+            },
+            ensure_ascii=False,
+            indent=2,
+        ),
+        encoding="utf-8",
+    )
+    os.replace(tmp_layout_path, layout_path)
+    return skeleton
+
+
+def prepare_skeleton(docx_template_path: Path) -> None:
+    if pdfplumber is None or FPDF is None:
+        return
+    get_skeleton(docx_template_path, get_file_hash(docx_template_path))
+
+
+def render_overlay(
+    skeleton: Skeleton,
+    replacement_words: dict[str, str],
+    fonts: Mapping[str, str] | None,
+) -> bytes:
+    words = {key.upper(): value for key, value in replacement_words.items()}
+    renderer = NativeRenderer(fonts)
+    pdf = FPDF(unit="pt")
+    pdf.set_auto_page_break(False)
+    renderer.add_fonts(pdf)
+    for page_number, page_size in enumerate(skeleton.pages):
+        pdf.add_page(format=page_size)
+        for slot in skeleton.slots:
+            if slot.page != page_number:
+                continue
+            text = words.get(slot.name, f"[{slot.name}]")
+            renderer.check_text(text)
+            pdf.set_font(
+                renderer.get_font_family(slot.font), slot.style, slot.size
+            )
+            if "\n" in text or (
+                pdf.get_string_width(text)
+                > slot.right - slot.x + WIDTH_TOLERANCE
+            ):
+                raise UnsupportedOverlay(
+                    _('text of "{name}" does not fit on page {page}').format(
+                        name=slot.name, page=page_number + 1
+                    )
+                )
+            pdf.text(slot.x, slot.baseline, text)
+    return bytes(pdf.output())
+
+
+def convert_docx_template_to_pdf_by_overlay(
+    docx_template_path: Path,
+    pdf_file_path: Path,
+    replacement_words: dict[str, str],
+    template_hash: str,
+    fonts: Mapping[str, str] | None = None,
+) -> bool:
+    try:
+        if pdfplumber is None or FPDF is None:
+            raise UnsupportedOverlay(
+                _("fpdf2, pdfplumber and pypdf are not installed")
+            )
+        skeleton = get_skeleton(docx_template_path, template_hash)
+        if skeleton.error:
+            raise UnsupportedOverlay(skeleton.error)
+        overlay = render_overlay(skeleton, replacement_words, fonts)
+    except (UnsupportedOverlay, UnsupportedDocument) as e:
+        logger.warning(
+            _("PDF skeleton is not used for {path}: {reason}").format(
+                path=docx_template_path, reason=e
+            )
+        )
+        return False
+
+    writer = PdfWriter()
+    overlay_pages = PdfReader(io.BytesIO(overlay)).pages
+    for page, overlay_page in zip(
+        PdfReader(skeleton.path).pages, overlay_pages
+    ):
+        page.merge_page(overlay_page)
+        writer.add_page(page)
+    writer.write(pdf_file_path)
+    logger.debug(_("Document converted to {path}").format(path=pdf_file_path))
+    return True
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from logger import logger, _
+from analyzer import TemplateCatalog
+from config import Config
+from jobs import (
+    DocTemplate,
+    Job,
+    get_pdf_file_path,
+    get_replacement_words,
+    render_job,
+)
+
+
+@dataclass
+class RenderGroup:
+    content_key: str
+    outputs: dict[Job, Path] = field(default_factory=dict)
+
+
+def get_content_key(
+    catalog: TemplateCatalog,
+    replacement_words: Mapping[str, str],
+) -> str:
+    # Only the placeholders of the template end up in the document, so jobs
+    # that differ in other fields (usually the output name) are the same
+    # document. Like replace_words_in_paragraph, a placeholder only takes the
+    # value of the key it equals after upper-casing.
+    words = {key.upper(): value for key, value in replacement_words.items()}
+    content = json.dumps(
+        [
+            catalog.template_hash,
+            [words.get(name) for name in sorted(catalog.names)],
+        ],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def get_job_output(
+    config: Config,
+    job: Job,
+    doc_templates: Mapping[str, DocTemplate],
+    executors: Mapping[str, Mapping[str, str]],
+    catalogs: Mapping[str, TemplateCatalog],
+) -> tuple[str, Path]:
+    replacement_words = get_replacement_words(
+        config=config,
+        job=job,
+        doc_template=doc_templates[job.template_label],
+        executor_data=executors[job.executor_label],
+    )
+    return (
+        get_content_key(catalogs[job.template_label], replacement_words),
+        get_pdf_file_path(config, replacement_words),
+    )
+
+
+def plan_renders(
+    config: Config,
+    jobs: Iterable[Job],
+    doc_templates: Mapping[str, DocTemplate],
+    executors: Mapping[str, Mapping[str, str]],
+    catalogs: Mapping[str, TemplateCatalog],
+) -> list[RenderGroup]:
+    groups: dict[str, RenderGroup] = {}
+    for job in jobs:
+        content_key, pdf_file_path = get_job_output(
+            config, job, doc_templates, executors, catalogs
+        )
+        group = groups.setdefault(content_key, RenderGroup(content_key))
+        group.outputs[job] = pdf_file_path
+    return list(groups.values())
+
+
+def log_plan_summary(job_count: int, render_count: int) -> None:
+    removed = job_count - render_count
+    logger.info(
+        _(
+            "Render plan: {jobs} jobs, {renders} unique documents, "
+            "{removed} renders removed ({percent:.0%})"
+        ).format(
+            jobs=job_count,
+            renders=render_count,
+            removed=removed,
+            percent=removed / job_count if job_count else 0,
+        )
+    )
+
+
+def link_or_copy(source_path: Path, pdf_file_path: Path) -> None:
+    if pdf_file_path == source_path:
+        return
+    tmp_pdf_file_path = pdf_file_path.with_name(
+        f".{pdf_file_path.stem}.{uuid.uuid4().hex}.pdf"
+    )
+    try:
+        try:
+            os.link(source_path, tmp_pdf_file_path)
+        except OSError:
+            shutil.copyfile(source_path, tmp_pdf_file_path)
+        os.replace(tmp_pdf_file_path, pdf_file_path)
+    finally:
+        tmp_pdf_file_path.unlink(missing_ok=True)
+    logger.debug(
+        _("Document linked: {path}").format(path=pdf_file_path),
+    )
+
+
+def render_group(
+    config: Config,
+    group: RenderGroup,
+    jobs: list[Job],
+    doc_templates: dict[str, DocTemplate],
+    executors: Mapping[str, Mapping[str, str]],
+) -> None:
+    source_path = render_job(config, jobs[0], doc_templates, executors)
+    for job in jobs[1:]:
+        link_or_copy(source_path, group.outputs[job])
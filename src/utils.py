@@ -1,16 +1,22 @@
+from collections.abc import Iterator, Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import csv
 import contextlib
+import hashlib
 import io
 import shutil
+import tempfile
 
 from num2words import num2words
 from docx2pdf import convert
 from docx import Document
+from docx.document import Document as DocumentObject
 from docx.text.paragraph import Paragraph
 from docx.table import Table, _Cell
 
 from logger import logger, _, lang_name
+from native import NativeRenderer, UnsupportedDocument, check_supported
 
 
 def replace_words_in_paragraph(
@@ -63,15 +69,10 @@ def process_cell(
         )
 
 
-def replace_words_in_doc(
-    src_doc_path: Path | str,
-    dst_doc_path: Path | str,
+def process_document(
+    doc: DocumentObject,
     replacement_words: dict[str, str],
 ) -> None:
-    shutil.copy(src_doc_path, dst_doc_path)
-
-    doc = Document(str(dst_doc_path))
-
     logger.debug(_("Words replaced in paragraphs"))
     process_paragraphs(
         doc.paragraphs,
@@ -82,15 +83,96 @@ def replace_words_in_doc(
     for table in doc.tables:
         process_table(table, replacement_words)
 
+
+def replace_words_in_doc(
+    src_doc_path: Path | str,
+    dst_doc_path: Path | str,
+    replacement_words: dict[str, str],
+) -> None:
+    shutil.copy(src_doc_path, dst_doc_path)
+
+    doc = Document(str(dst_doc_path))
+    process_document(doc, replacement_words)
     doc.save(str(dst_doc_path))
 
 
+def convert_docx_template_to_pdf_natively(
+    docx_template_path: Path,
+    pdf_file_path: Path,
+    replacement_words: dict[str, str],
+    fonts: Mapping[str, str] | None = None,
+) -> bool:
+    doc = Document(str(docx_template_path))
+    try:
+        check_supported(doc)
+    except UnsupportedDocument as e:
+        logger.info(
+            _("Native renderer is not used for {path}: {reason}").format(
+                path=docx_template_path, reason=e
+            )
+        )
+        return False
+    process_document(doc, replacement_words)
+    try:
+        NativeRenderer(fonts).render(doc, pdf_file_path)
+    except UnsupportedDocument as e:
+        logger.info(
+            _("Native renderer is not used for {path}: {reason}").format(
+                path=docx_template_path, reason=e
+            )
+        )
+        pdf_file_path.unlink(missing_ok=True)
+        return False
+    logger.debug(_("Document converted to {path}").format(path=pdf_file_path))
+    return True
+
+
+def convert_docx_template_to_pdf_quickly(
+    docx_template_path: Path,
+    pdf_file_path: Path,
+    replacement_words: dict[str, str],
+    renderer: str,
+    fonts: Mapping[str, str] | None = None,
+) -> bool:
+    if renderer == "native":
+        return convert_docx_template_to_pdf_natively(
+            docx_template_path=docx_template_path,
+            pdf_file_path=pdf_file_path,
+            replacement_words=replacement_words,
+            fonts=fonts,
+        )
+    if renderer == "overlay":
+        from overlay import convert_docx_template_to_pdf_by_overlay
+
+        return convert_docx_template_to_pdf_by_overlay(
+            docx_template_path=docx_template_path,
+            pdf_file_path=pdf_file_path,
+            replacement_words=replacement_words,
+            template_hash=get_file_hash(docx_template_path),
+            fonts=fonts,
+        )
+    return False
+
+
 def convert_docx_template_to_pdf(
     docx_template_path: Path,
     pdf_file_path: Path,
     replacement_words: dict[str, str],
+    renderer: str = "docx2pdf",
+    fonts: Mapping[str, str] | None = None,
 ) -> None:
-    docx_modified_path = Path(f"{docx_template_path}.mdf.docx")
+    if convert_docx_template_to_pdf_quickly(
+        docx_template_path=docx_template_path,
+        pdf_file_path=pdf_file_path,
+        replacement_words=replacement_words,
+        renderer=renderer,
+        fonts=fonts,
+    ):
+        return
+
+    docx_modified_path = pdf_file_path.with_name(
+        f"{pdf_file_path.stem}.mdf.docx"
+    )
     logger.debug(_("File {path} created").format(path=docx_modified_path))
 
     logger.debug(_("Start words replace in document"))
@@ -119,6 +201,95 @@ def convert_docx_template_to_pdf(
     logger.debug(_("Document converted to {path}").format(path=pdf_file_path))
 
 
+def convert_docx_templates_to_pdf(
+    documents: Sequence[tuple[Path, Path, dict[str, str], str]],
+    fonts: Mapping[str, str] | None = None,
+) -> None:
+    # Documents are filled (or rendered without Word) in parallel, and all
+    # the rest are converted in one call, so Word is started only once.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        docx_dir = Path(tmp_dir) / "docx"
+        pdf_dir = Path(tmp_dir) / "pdf"
+        docx_dir.mkdir()
+        pdf_dir.mkdir()
+
+        def prepare_document(
+            number: int,
+            document: tuple[Path, Path, dict[str, str], str],
+        ) -> bool:
+            docx_template_path, pdf_file_path, replacement_words, renderer = (
+                document
+            )
+            if convert_docx_template_to_pdf_quickly(
+                docx_template_path=docx_template_path,
+                pdf_file_path=pdf_file_path,
+                replacement_words=replacement_words,
+                renderer=renderer,
+                fonts=fonts,
+            ):
+                return False
+            replace_words_in_doc(
+                docx_template_path,
+                docx_dir / f"{number}.docx",
+                replacement_words,
+            )
+            return True
+
+        # Skeletons are built with Word, which worker threads cannot use
+        # without initializing COM, so the missing ones are built here first.
+        overlay_paths = {
+            document[0] for document in documents if document[3] == "overlay"
+        }
+        if overlay_paths:
+            from overlay import prepare_skeleton
+
+            for docx_template_path in overlay_paths:
+                prepare_skeleton(docx_template_path)
+
+        with ThreadPoolExecutor() as executor:
+            pending = list(
+                executor.map(
+                    prepare_document, range(len(documents)), documents
+                )
+            )
+        if not any(pending):
+            return
+
+        logger.debug(_("Start documents convert"))
+        with (
+            contextlib.redirect_stdout(io.StringIO()),
+            contextlib.redirect_stderr(io.StringIO()),
+        ):
+            convert(input_path=docx_dir, output_path=pdf_dir, keep_active=True)
+        logger.debug(_("End documents convert"))
+
+        for number, (docx_template_path, pdf_file_path, *rest) in enumerate(
+            documents
+        ):
+            if not pending[number]:
+                continue
+            converted_path = pdf_dir / f"{number}.pdf"
+            if not converted_path.exists():
+                logger.error(
+                    _("Document {path} not converted").format(
+                        path=docx_template_path
+                    )
+                )
+                continue
+            shutil.move(converted_path, pdf_file_path)
+            logger.debug(
+                _("Document converted to {path}").format(path=pdf_file_path)
+            )
+
+
+def get_file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 def number_to_words_currency(
     number: int | float,
     currency_pluralize: list[str],
@@ -138,6 +309,20 @@ def number_to_words_currency(
     return f"{words} {currency}"
 
 
+def check_headers(
+    headers: Sequence[str],
+    wrong_headers: set[str] | None = None,
+) -> None:
+    if wrong_headers:
+        finded_wrong_headers = wrong_headers & set(headers)
+        if len(finded_wrong_headers) > 0:
+            raise ValueError(
+                _("Wrong headers: {headers}").format(
+                    headers=", ".join(finded_wrong_headers),
+                )
+            )
+
+
 def csv_to_dict(
     csv_path: Path,
     wrong_headers: set[str] | None = None,
@@ -148,12 +333,91 @@ def csv_to_dict(
         rows = list(reader)
     if not headers:
         raise ValueError(_("Headers not found"))
-    if wrong_headers:
-        finded_wrong_headers = wrong_headers & set(headers)
-        if len(finded_wrong_headers) > 0:
-            raise ValueError(
-                _("Wrong headers: {headers}").format(
-                    headers=", ".join(finded_wrong_headers),
-                )
-            )
+    check_headers(headers, wrong_headers)
     return {row[headers[0]]: row for row in rows}
+
+
+CELL_CACHE_CHECK_ROWS = 1000
+
+
+class ExecutorRow(Mapping[str, str]):
+    __slots__ = ("index", "cells")
+
+    def __init__(self, index: dict[str, int], cells: tuple[str, ...]) -> None:
+        self.index = index
+        self.cells = cells
+
+    def __getitem__(self, header: str) -> str:
+        return self.cells[self.index[header]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.index)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class ExecutorTable(Mapping[str, ExecutorRow]):
+    # One header schema shared by all rows; every row is a plain tuple and
+    # repeated cell values are stored once, so a large registry costs a
+    # fraction of a dict per row.
+
+    def __init__(
+        self,
+        headers: list[str],
+        rows: dict[str, tuple[str, ...]],
+    ) -> None:
+        self.headers = tuple(headers)
+        self.index = {header: i for i, header in enumerate(self.headers)}
+        self.rows = rows
+
+    def __getitem__(self, label: str) -> ExecutorRow:
+        return ExecutorRow(self.index, self.rows[label])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.rows)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __repr__(self) -> str:
+        return "ExecutorTable(headers={headers}, rows={rows})".format(
+            headers=list(self.headers), rows=len(self.rows)
+        )
+
+
+def csv_to_table(
+    csv_path: Path,
+    wrong_headers: set[str] | None = None,
+) -> ExecutorTable:
+    with open(csv_path, "r", encoding="utf-8") as csv_file:
+        reader = csv.reader(csv_file, delimiter=";")
+        headers = next(reader, None)
+        if not headers:
+            raise ValueError(_("Headers not found"))
+        check_headers(headers, wrong_headers)
+        width = len(headers)
+        caches: list[dict[str, str] | None] = [{} for header in headers]
+        rows: dict[str, tuple[str, ...]] = {}
+        for number, row in enumerate(reader, 1):
+            if not row:
+                continue
+            row += [""] * (width - len(row))
+            cells = tuple(
+                value if cache is None else cache.setdefault(value, value)
+                for cache, value in zip(caches, row)
+            )
+            rows[cells[0]] = cells
+            if number % CELL_CACHE_CHECK_ROWS == 0:
+                # Columns of mostly unique values gain nothing from sharing
+                # equal strings, so stop caching them.
+                caches = [
+                    None
+                    if cache is None or len(cache) > number // 2
+                    else cache
+                    for cache in caches
+                ]
+    return ExecutorTable(headers, rows)
@@ -0,0 +1,194 @@
+import argparse
+import hashlib
+import json
+import time
+from collections.abc import Mapping
+from datetime import date
+from pathlib import Path
+
+from logger import logger, _
+from analyzer import check_templates
+from batch import check_date_year, get_batch_jobs, numeric
+from config import Config, load_config
+from jobs import APP_VARIABLES, Job, load_doc_templates
+from planner import log_plan_summary, plan_renders, render_group
+from utils import csv_to_table, get_file_hash
+
+
+STATE_FILE_NAME = ".watch_state.json"
+
+
+def get_row_hash(row: Mapping[str, str]) -> str:
+    content = json.dumps(dict(row), ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def get_job_hash(job: Job, template_hash: str, row_hash: str) -> str:
+    content = "\n".join([job.key, template_hash, row_hash])
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def get_snapshot(config: Config) -> dict[Path, tuple[int, int]]:
+    paths = [config["DATA_PATH"]]
+    paths += [
+        config["DOC_TEMPLATES_DIR"] / name
+        for label, name, *options in config["DOC_TEMPLATES_FILES"]
+    ]
+    snapshot = {}
+    for path in paths:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+def wait_for_changes(
+    config: Config,
+    snapshot: dict[Path, tuple[int, int]],
+) -> dict[Path, tuple[int, int]]:
+    while (current := get_snapshot(config)) == snapshot:
+        time.sleep(config["WATCH_POLL_SECONDS"])
+    # Editors save in several steps, so wait until the files stop changing
+    # before rendering anything.
+    changed_at = time.monotonic()
+    while time.monotonic() - changed_at < config["WATCH_DEBOUNCE_SECONDS"]:
+        time.sleep(config["WATCH_POLL_SECONDS"])
+        latest = get_snapshot(config)
+        if latest != current:
+            current = latest
+            changed_at = time.monotonic()
+    return current
+
+
+def load_state(state_path: Path) -> dict[str, str]:
+    if not state_path.exists():
+        return {}
+    return json.loads(state_path.read_text(encoding="utf-8"))
+
+
+def save_state(state_path: Path, state: dict[str, str]) -> None:
+    tmp_state_path = state_path.with_name(f"{state_path.name}.tmp")
+    tmp_state_path.write_text(
+        json.dumps(state, ensure_ascii=False, indent=2),
+        encoding="utf-8",
+    )
+    tmp_state_path.replace(state_path)
+
+
+def render_changed(
+    config: Config,
+    doc_date: date,
+    doc_num: str,
+    amount: str,
+    state: dict[str, str],
+) -> dict[str, str]:
+    doc_templates = load_doc_templates(config)
+    executors = csv_to_table(
+        csv_path=config["DATA_PATH"],
+        wrong_headers=set(APP_VARIABLES),
+    )
+    catalogs = check_templates(config, doc_templates, executors.headers)
+    template_hashes = {
+        label: get_file_hash(doc_template.path)
+        for label, doc_template in doc_templates.items()
+    }
+    row_hashes = {label: get_row_hash(row) for label, row in executors.items()}
+
+    jobs = get_batch_jobs(doc_templates, executors, doc_date, doc_num, amount)
+    new_state = {}
+    job_hashes = {}
+    for job in jobs:
+        state_key = f"{job.template_label}|{job.executor_label}"
+        job_hash = get_job_hash(
+            job,
+            template_hashes[job.template_label],
+            row_hashes[job.executor_label],
+        )
+        if state.get(state_key) == job_hash:
+            new_state[state_key] = job_hash
+        else:
+            job_hashes[job] = job_hash
+
+    groups = plan_renders(
+        config, job_hashes, doc_templates, executors, catalogs
+    )
+    if job_hashes:
+        log_plan_summary(len(job_hashes), len(groups))
+    rendered = 0
+    failed = 0
+    for group in groups:
+        group_jobs = list(group.outputs)
+        try:
+            render_group(config, group, group_jobs, doc_templates, executors)
+        except Exception as e:
+            logger.error(
+                _("Job {job} failed: {e}").format(job=group_jobs[0].key, e=e),
+            )
+            failed += len(group_jobs)
+            continue
+        for job in group_jobs:
+            new_state[f"{job.template_label}|{job.executor_label}"] = (
+                job_hashes[job]
+            )
+        rendered += len(group_jobs)
+
+    logger.info(
+        _(
+            "Documents re-rendered: {count}, failed: {failed}, "
+            "unchanged: {unchanged}"
+        ).format(
+            count=rendered,
+            failed=failed,
+            unchanged=len(jobs) - len(job_hashes),
+        )
+    )
+    return new_state
+
+
+def run_watch(args: argparse.Namespace) -> None:
+    config = load_config()
+    check_date_year(config, args.date)
+    state_path = config["PDF_DIR"] / STATE_FILE_NAME
+    state = load_state(state_path)
+    snapshot: dict[Path, tuple[int, int]] = {}
+    logger.info(
+        _("Watching {data} and {templates}").format(
+            data=config["DATA_PATH"], templates=config["DOC_TEMPLATES_DIR"]
+        )
+    )
+    try:
+        while True:
+            snapshot = wait_for_changes(config, snapshot)
+            try:
+                state = render_changed(
+                    config=config,
+                    doc_date=args.date,
+                    doc_num=args.doc_num,
+                    amount=args.amount,
+                    state=state,
+                )
+            except Exception as e:
+                # Files may be caught mid-save or locked by Word; the
+                # previous state is kept and the next change is tried again.
+                logger.error(
+                    _("Changes not rendered: {error}").format(
+                        error=f"{type(e).__name__}: {e}"
+                    )
+                )
+                continue
+            save_state(state_path, state)
+    except KeyboardInterrupt:
+        logger.info(_("Watching stopped"))
+
+
+def add_watch_parser(subparsers: argparse._SubParsersAction) -> None:
+    parser = subparsers.add_parser(
+        "watch",
+        help=_("Re-render documents when the data file or templates change"),
+    )
+    parser.add_argument("--date", type=date.fromisoformat, required=True)
+    parser.add_argument("--doc-num", type=numeric, required=True)
+    parser.add_argument("--amount", type=numeric, required=True)
+    parser.set_defaults(handler=run_watch)
@@ -0,0 +1,74 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from docx import Document
+from docx.document import Document as DocumentObject
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+
+from analyzer import TemplateCatalog, analyze_template
+
+
+class AnalyzeTemplateTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = Path(tmp_dir.name) / "template.docx"
+
+    def analyze(self, doc: DocumentObject) -> TemplateCatalog:
+        doc.save(str(self.path))
+        return analyze_template(self.path, "template-hash")
+
+    def test_bracketed_text(self) -> None:
+        doc = Document()
+        doc.add_paragraph("See note [1] and [sic] in [DOC_NUM] for [ИНН]")
+        self.assertEqual(self.analyze(doc).names, {"DOC_NUM", "ИНН"})
+
+    def test_parts_that_are_not_replaced(self) -> None:
+        doc = Document()
+        doc.add_paragraph("Invoice [DOC_NUM]")
+        doc.add_table(rows=1, cols=1).cell(0, 0).text = "[AMOUNT]"
+        doc.element.body.insert(
+            0,
+            parse_xml(
+                f"<w:sdt {nsdecls('w')}><w:sdtContent><w:p><w:r>"
+                "<w:t>[AMOUNT_TXET]</w:t></w:r></w:p></w:sdtContent></w:sdt>"
+            ),
+        )
+        doc.paragraphs[-1]._p.append(
+            parse_xml(
+                f"<w:hyperlink {nsdecls('w')}><w:r><w:t>[DOC_NUMM]</w:t>"
+                "</w:r></w:hyperlink>"
+            )
+        )
+        doc.sections[0].header.paragraphs[0].text = "[DOC_DATE]"
+        self.assertEqual(
+            {
+                (placeholder.name, placeholder.part)
+                for placeholder in self.analyze(doc).placeholders
+            },
+            {
+                ("DOC_NUM", "body"),
+                ("AMOUNT", "body"),
+                ("AMOUNT_TXET", "content control"),
+                ("DOC_NUMM", "hyperlink"),
+                ("DOC_DATE", "section 1 header"),
+            },
+        )
+
+    def test_split_placeholder(self) -> None:
+        doc = Document()
+        paragraph = doc.add_paragraph("Invoice [DOC_")
+        paragraph.add_run("NUM] for [AMOUNT]")
+        self.assertEqual(
+            [
+                (placeholder.name, placeholder.split)
+                for placeholder in self.analyze(doc).placeholders
+            ],
+            [("DOC_NUM", True), ("AMOUNT", False)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
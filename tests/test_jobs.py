@@ -0,0 +1,55 @@
+import unittest
+
+from config import load_config
+from jobs import APP_VARIABLES, build_job, load_doc_templates
+from utils import csv_to_table
+
+
+class BuildJobTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.config = load_config()
+        self.doc_templates = load_doc_templates(self.config)
+        self.executors = csv_to_table(
+            csv_path=self.config["DATA_PATH"],
+            wrong_headers=set(APP_VARIABLES),
+        )
+        self.record = {
+            "DOC_TEMPLATE_LABEL": next(iter(self.doc_templates)),
+            "DATE_DAY": "1",
+            "DATE_MONTH": "3",
+            "DATE_YEAR": str(self.config["DATE_YEAR_MIN"]),
+            "EXECUTOR_LABEL": next(iter(self.executors)),
+            "DOC_NUM": "7",
+            "AMOUNT": "100",
+        }
+
+    def build(self, **fields: str) -> None:
+        build_job(
+            self.config,
+            self.record | fields,
+            self.doc_templates,
+            self.executors,
+        )
+
+    def test_valid_record(self) -> None:
+        job = build_job(
+            self.config, self.record, self.doc_templates, self.executors
+        )
+        self.assertEqual((job.date_day, job.date_month), ("01", "03"))
+
+    def test_non_ascii_digits(self) -> None:
+        for field, value in [
+            ("DOC_NUM", "٣"),
+            ("AMOUNT", "１００"),
+            ("DATE_DAY", "²"),
+        ]:
+            with self.subTest(field=field), self.assertRaises(ValueError):
+                self.build(**{field: value})
+
+    def test_day_out_of_month(self) -> None:
+        with self.assertRaises(ValueError):
+            self.build(DATE_MONTH="2", DATE_DAY="30")
+
+
+if __name__ == "__main__":
+    unittest.main()
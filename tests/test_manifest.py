@@ -0,0 +1,197 @@
+import multiprocessing
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+import batch
+from config import load_config
+from jobs import APP_VARIABLES, load_doc_templates
+from manifest import (
+    MAX_SHARD_ATTEMPTS,
+    LockDirManifest,
+    Manifest,
+    SqliteManifest,
+    open_manifest,
+)
+from utils import csv_to_table
+
+SHARD_COUNT = 4
+LEASE = 60.0
+
+
+class ManifestTests(unittest.TestCase):
+    manifest_name = ""
+
+    def setUp(self) -> None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = Path(tmp_dir.name) / self.manifest_name
+
+    def open(self) -> Manifest:
+        manifest = open_manifest(self.path)
+        manifest.prepare("fingerprint", SHARD_COUNT)
+        return manifest
+
+    def claim(self, manifest: Manifest, node: str, lease: float) -> int:
+        shard_id = manifest.claim(node, lease)
+        assert shard_id is not None
+        return shard_id
+
+    def test_claim_all_shards(self) -> None:
+        first, second = self.open(), self.open()
+        claimed = [
+            self.claim(first, "first", LEASE),
+            self.claim(second, "second", LEASE),
+        ]
+        claimed += [self.claim(first, "first", LEASE) for _shard in range(2)]
+        self.assertEqual(sorted(claimed), list(range(SHARD_COUNT)))
+        self.assertIsNone(second.claim("second", LEASE))
+        self.assertFalse(first.is_finished())
+        for shard_id in claimed:
+            if shard_id == claimed[1]:
+                self.assertTrue(second.finish(shard_id, "second"))
+            else:
+                self.assertTrue(first.finish(shard_id, "first"))
+        self.assertTrue(first.is_finished())
+
+    def test_fingerprint_mismatch(self) -> None:
+        self.open()
+        with self.assertRaises(ValueError):
+            open_manifest(self.path).prepare("other", SHARD_COUNT)
+
+    def test_expired_lease_is_taken_over(self) -> None:
+        stale, current = self.open(), self.open()
+        shard_id = self.claim(stale, "stale", -1.0)
+        self.assertEqual(current.claim("current", LEASE), shard_id)
+        self.assertFalse(stale.renew(shard_id, "stale", LEASE))
+        self.assertFalse(stale.finish(shard_id, "stale"))
+        self.assertTrue(current.renew(shard_id, "current", LEASE))
+        self.assertTrue(current.finish(shard_id, "current"))
+
+    def test_done_jobs_ignore_errors(self) -> None:
+        manifest = self.open()
+        manifest.mark_done(["a", "b"], 0, "node")
+        manifest.mark_done(["c"], 0, "node", error="failed")
+        self.assertEqual(manifest.get_done_jobs(["a", "c", "d"]), {"a"})
+        self.assertEqual(
+            manifest.get_summary(),
+            {"shards": 4, "shards_done": 0, "jobs_done": 2, "jobs_failed": 1},
+        )
+
+    def test_failed_shard_retry_limit(self) -> None:
+        manifest = self.open()
+        for attempt in range(1, MAX_SHARD_ATTEMPTS + 1):
+            shard_id = manifest.claim("node", LEASE)
+            self.assertEqual(shard_id, 0)
+            manifest.mark_done(["a"], 0, "node", error="failed")
+            self.assertEqual(
+                manifest.finish(0, "node", failed=True),
+                attempt == MAX_SHARD_ATTEMPTS,
+            )
+        self.assertEqual(manifest.claim("node", LEASE), 1)
+
+    def test_new_run_reopens_failed_shards(self) -> None:
+        manifest = self.open()
+        for shard_id in range(SHARD_COUNT):
+            self.assertEqual(manifest.claim("node", LEASE), shard_id)
+            if shard_id == 2:
+                manifest.mark_done(["a"], shard_id, "node", error="failed")
+            manifest.finish(shard_id, "node")
+        self.assertTrue(manifest.is_finished())
+
+        manifest = self.open()
+        self.assertFalse(manifest.is_finished())
+        self.assertEqual(manifest.claim("node", LEASE), 2)
+        manifest.mark_done(["a"], 2, "node")
+        self.assertTrue(manifest.finish(2, "node"))
+        self.assertTrue(manifest.is_finished())
+
+
+class SqliteManifestTest(ManifestTests):
+    manifest_name = "manifest.sqlite"
+
+    def test_open(self) -> None:
+        self.assertIsInstance(self.open(), SqliteManifest)
+
+
+class LockDirManifestTest(ManifestTests):
+    manifest_name = "manifest"
+
+    def test_open(self) -> None:
+        self.assertIsInstance(self.open(), LockDirManifest)
+
+    def test_without_hard_links(self) -> None:
+        with mock.patch("os.link", side_effect=OSError(95, "Not supported")):
+            self.path = self.path.with_name("takeover")
+            self.test_expired_lease_is_taken_over()
+            self.path = self.path.with_name("retry")
+            self.test_failed_shard_retry_limit()
+        self.assertTrue((self.path / "manifest.json").is_file())
+
+
+def record_render(path: Path, jobs: list[Any]) -> None:
+    with open(path, "a", encoding="utf-8") as file:
+        file.write("".join(f"{job.key}\n" for job in jobs))
+
+
+@unittest.skipUnless(
+    multiprocessing.get_start_method() == "fork",
+    "the stubbed renderer is passed to the nodes by fork",
+)
+class LocalNodesTest(unittest.TestCase):
+    def run_nodes(self, manifest_path: Path, log_path: Path) -> None:
+        with (
+            mock.patch.object(batch, "POLL_INTERVAL", 0.05),
+            mock.patch.object(
+                batch,
+                "render_group",
+                lambda config, group, jobs, *args: record_render(
+                    log_path, jobs
+                ),
+            ),
+        ):
+            batch.run_local_nodes(
+                count=4,
+                node="test",
+                manifest_path=manifest_path,
+                doc_date=date(2025, 3, 31),
+                doc_num="1",
+                amount="100",
+            )
+
+    def test_no_job_lost_or_duplicated(self) -> None:
+        config = load_config()
+        executors = csv_to_table(
+            csv_path=config["DATA_PATH"],
+            wrong_headers=set(APP_VARIABLES),
+        )
+        jobs = batch.get_batch_jobs(
+            load_doc_templates(config),
+            executors,
+            date(2025, 3, 31),
+            "1",
+            "100",
+        )
+        for name in ["manifest.sqlite", "manifest"]:
+            with (
+                self.subTest(manifest=name),
+                tempfile.TemporaryDirectory() as tmp_dir,
+            ):
+                log_path = Path(tmp_dir) / "rendered.log"
+                self.run_nodes(Path(tmp_dir) / name, log_path)
+                rendered = log_path.read_text(encoding="utf-8").splitlines()
+                self.assertEqual(
+                    sorted(rendered), sorted(job.key for job in jobs)
+                )
+                summary = open_manifest(Path(tmp_dir) / name).get_summary()
+                self.assertEqual(summary["jobs_done"], len(jobs))
+
+
+del ManifestTests
+
+
+if __name__ == "__main__":
+    unittest.main()
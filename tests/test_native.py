@@ -0,0 +1,88 @@
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+import pdfplumber
+from docx import Document
+from docx.document import Document as DocumentObject
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from PIL import Image
+
+from utils import convert_docx_template_to_pdf_natively
+
+
+def get_png() -> io.BytesIO:
+    image = io.BytesIO()
+    Image.new("RGB", (10, 10)).save(image, "PNG")
+    image.seek(0)
+    return image
+
+
+class NativeRendererTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_path = Path(tmp_dir.name)
+
+    def convert(self, doc: DocumentObject) -> bool:
+        doc.save(str(self.tmp_path / "template.docx"))
+        return convert_docx_template_to_pdf_natively(
+            self.tmp_path / "template.docx",
+            self.tmp_path / "document.pdf",
+            {},
+        )
+
+    def test_table_cell_style(self) -> None:
+        doc = Document()
+        paragraph = doc.add_table(rows=1, cols=1).cell(0, 0).paragraphs[0]
+        paragraph.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+        paragraph.add_run("Bold").bold = True
+        self.assertTrue(self.convert(doc))
+        with pdfplumber.open(self.tmp_path / "document.pdf") as pdf:
+            chars = pdf.pages[0].chars
+        self.assertIn("Bold", chars[0]["fontname"])
+        self.assertGreater(chars[0]["x0"], pdf.pages[0].width / 2)
+
+    def test_table_cell_mixed_formatting(self) -> None:
+        doc = Document()
+        paragraph = doc.add_table(rows=1, cols=1).cell(0, 0).paragraphs[0]
+        paragraph.add_run("Bold ").bold = True
+        paragraph.add_run("plain")
+        self.assertFalse(self.convert(doc))
+        self.assertFalse((self.tmp_path / "document.pdf").exists())
+
+    def test_table_cell_image(self) -> None:
+        doc = Document()
+        cell = doc.add_table(rows=1, cols=1).cell(0, 0)
+        cell.paragraphs[0].add_run().add_picture(get_png())
+        self.assertFalse(self.convert(doc))
+
+    def test_images(self) -> None:
+        for content_type, blob in [
+            ("image/x-emf", None),
+            ("image/png", b"not an image"),
+        ]:
+            with self.subTest(content_type=content_type):
+                doc = Document()
+                doc.add_paragraph().add_run().add_picture(get_png())
+                image_part = next(
+                    part
+                    for part in doc.part.related_parts.values()
+                    if part.content_type.startswith("image/")
+                )
+                image_part._content_type = content_type
+                image_part._blob = blob or image_part.blob
+                self.assertFalse(self.convert(doc))
+                self.assertFalse((self.tmp_path / "document.pdf").exists())
+
+    def test_first_page_header(self) -> None:
+        doc = Document()
+        doc.sections[0].different_first_page_header_footer = True
+        doc.sections[0].first_page_header.paragraphs[0].text = "Header"
+        doc.add_paragraph("Body")
+        self.assertFalse(self.convert(doc))
+
+
+if __name__ == "__main__":
+    unittest.main()
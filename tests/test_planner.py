@@ -0,0 +1,37 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from docx import Document
+
+from analyzer import analyze_template
+from planner import get_content_key
+
+
+class GetContentKeyTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        path = Path(tmp_dir.name) / "template.docx"
+        doc = Document()
+        doc.add_paragraph("Invoice [DOC_NUM] for [FULL NAME], tax id [ИНН]")
+        doc.save(str(path))
+        self.catalog = analyze_template(path, "template-hash")
+
+    def test_rows_differing_in_non_ascii_column(self) -> None:
+        row = {"DOC_NUM": "1", "Full Name": "Jane Roe", "ИНН": "111"}
+        self.assertNotEqual(
+            get_content_key(self.catalog, row),
+            get_content_key(self.catalog, row | {"ИНН": "222"}),
+        )
+
+    def test_rows_differing_in_unused_column(self) -> None:
+        row = {"DOC_NUM": "1", "Full Name": "Jane Roe", "ИНН": "111"}
+        self.assertEqual(
+            get_content_key(self.catalog, row),
+            get_content_key(self.catalog, row | {"E-MAIL": "a@b.c"}),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()